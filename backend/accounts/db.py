@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from timing import record, timed_cursor_class
+
+# Потолок соединений одного контейнера
+MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX_CONNECTIONS', '4'))
+# Соединение, простоявшее без дела дольше этого срока, перед выдачей проверяем запросом SELECT 1
+CHECK_AFTER_SECONDS = 30
+# Сколько ждать свободного соединения, если все заняты
+ACQUIRE_TIMEOUT_SECONDS = 5
+
+
+class PoolExhausted(Exception):
+    '''Все соединения контейнера заняты'''
+
+
+_timed_connection = None
+
+
+def timed_connection_class():
+    '''Класс соединения, все курсоры которого замеряют запросы для Server-Timing; строится при первом подключении'''
+    global _timed_connection
+    if _timed_connection is None:
+        import psycopg2.extensions
+
+        class TimedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                kwargs['cursor_factory'] = timed_cursor_class(factory)
+                return super().cursor(*args, **kwargs)
+
+        _timed_connection = TimedConnection
+    return _timed_connection
+
+
+class ConnectionPool:
+    '''Пул соединений с Postgres на уровне модуля: тёплые вызовы функции переиспользуют соединения'''
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # Простаивающие соединения: (conn, время возврата)
+        self._idle = []
+        self._in_use = 0
+        self._available = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        self.broken = 0
+        self.connect_seconds = 0.0
+
+    def _healthy(self, conn, returned_at: float) -> bool:
+        import psycopg2
+
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < CHECK_AFTER_SECONDS:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        with self._available:
+            while True:
+                while self._idle:
+                    conn, returned_at = self._idle.pop()
+                    if self._healthy(conn, returned_at):
+                        self._in_use += 1
+                        self.hits += 1
+                        return conn
+                    self.broken += 1
+                    if not conn.closed:
+                        conn.close()
+
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    break
+
+                if not self._available.wait(ACQUIRE_TIMEOUT_SECONDS):
+                    raise PoolExhausted(f'Все {self.max_size} соединений с базой заняты')
+
+        # psycopg2 грузится при первом подключении, а не при импорте модуля: OPTIONS и ошибки валидации его не ждут
+        import psycopg2
+
+        started = time.perf_counter()
+        try:
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=timed_connection_class())
+        except Exception:
+            with self._available:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+        elapsed = time.perf_counter() - started
+        record('db_connect', elapsed)
+        self.misses += 1
+        self.connect_seconds += elapsed
+        return conn
+
+    def putconn(self, conn) -> None:
+        import psycopg2
+
+        # Незавершённую или упавшую транзакцию откатываем, чтобы следующий вызов получил чистое соединение
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+
+        with self._available:
+            self._in_use -= 1
+            if not conn.closed:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+            idle = self._in_use == 0
+
+        if idle:
+            print(json.dumps({'event': 'db_pool', **self.stats()}))
+
+    def stats(self) -> dict:
+        avg_connect_ms = self.connect_seconds * 1000 / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'broken': self.broken,
+            'open': len(self._idle) + self._in_use,
+            'avg_connect_ms': round(avg_connect_ms, 1),
+            # Оценка сэкономленного времени: каждое переиспользование избавило от одного подключения
+            'saved_ms': round(self.hits * avg_connect_ms, 1)
+        }
+
+
+POOL = ConnectionPool(MAX_CONNECTIONS)
+
+
+def get_connection():
+    return POOL.getconn()
+
+
+def release_connection(conn) -> None:
+    POOL.putconn(conn)
+
+
+@contextmanager
+def connection():
+    conn = POOL.getconn()
+    try:
+        yield conn
+    finally:
+        POOL.putconn(conn)
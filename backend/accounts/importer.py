@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+
+from psycopg2.extras import RealDictCursor
+
+# Сколько проблемных строк перечисляем в отчёте; итоговые счётчики считаются по всему файлу
+REPORT_LIMIT = 1000
+
+
+class RowStream:
+    '''Файлоподобная обёртка над генератором строк для COPY FROM STDIN: в памяти только текущий кусок'''
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def clean(value) -> str:
+    # Postgres не принимает NUL в text; пустую строку COPY в формате csv превращает в NULL
+    if value is None:
+        return ''
+    return str(value).replace('\x00', '').strip()
+
+
+def csv_rows(body: str):
+    '''(line, username, authToken, avatarUrl, malformed) из CSV; строка заголовка пропускается'''
+    reader = csv.reader(io.StringIO(body))
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if reader.line_num == 1 and row[0].strip().lower() == 'username':
+            continue
+        malformed = len(row) > 3
+        row = row + [''] * (3 - len(row))
+        yield reader.line_num, row[0], row[1], row[2], malformed
+
+
+def ndjson_rows(body: str):
+    '''(line, username, authToken, avatarUrl, malformed) из NDJSON; битая строка не прерывает импорт'''
+    for line_num, line in enumerate(io.StringIO(body), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        if not isinstance(item, dict):
+            yield line_num, None, None, None, True
+            continue
+        yield line_num, item.get('username'), item.get('authToken'), item.get('avatarUrl'), False
+
+
+def copy_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for line_num, username, auth_token, avatar_url, malformed in rows:
+        writer.writerow([line_num, clean(username), clean(auth_token), clean(avatar_url), 't' if malformed else 'f'])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def import_accounts(conn, body: str, fmt: str) -> dict:
+    '''Потоково заливает файл в staging через COPY и одним набором запросов сливает его в accounts.
+    Строки, которых нет в отчёте, вставлены'''
+    rows = csv_rows(body) if fmt == 'csv' else ndjson_rows(body)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    cur.execute('''
+        CREATE TEMP TABLE account_import (
+            line INTEGER PRIMARY KEY,
+            username TEXT,
+            auth_token TEXT,
+            avatar_url TEXT,
+            malformed BOOLEAN NOT NULL,
+            status TEXT,
+            reason TEXT
+        ) ON COMMIT DROP
+    ''')
+    cur.copy_expert(
+        'COPY account_import (line, username, auth_token, avatar_url, malformed) FROM STDIN WITH (FORMAT csv)',
+        RowStream(copy_lines(rows))
+    )
+
+    cur.execute('''
+        UPDATE account_import
+        SET status = 'invalid',
+            reason = CASE
+                WHEN malformed THEN 'malformed row'
+                WHEN username IS NULL THEN 'username is required'
+                ELSE 'authToken is required'
+            END
+        WHERE malformed OR username IS NULL OR auth_token IS NULL
+    ''')
+    # Повтор внутри файла: первая строка с таким username побеждает
+    cur.execute('''
+        UPDATE account_import AS i
+        SET status = 'duplicate', reason = 'repeated in file'
+        FROM (
+            SELECT line, row_number() OVER (PARTITION BY username ORDER BY line) AS n
+            FROM account_import
+            WHERE status IS NULL
+        ) AS d
+        WHERE i.line = d.line AND d.n > 1
+    ''')
+    cur.execute('''
+        WITH inserted AS (
+            INSERT INTO accounts (username, auth_token, avatar_url)
+            SELECT username, auth_token, COALESCE(avatar_url, '')
+            FROM account_import
+            WHERE status IS NULL
+            ORDER BY line
+            ON CONFLICT DO NOTHING
+            RETURNING username
+        )
+        UPDATE account_import AS i
+        SET status = 'inserted'
+        FROM inserted
+        WHERE i.username = inserted.username AND i.status IS NULL
+    ''')
+    cur.execute('''
+        UPDATE account_import
+        SET status = 'duplicate', reason = 'already exists'
+        WHERE status IS NULL
+    ''')
+
+    cur.execute('SELECT status, COUNT(*) AS count FROM account_import GROUP BY status')
+    report = {'inserted': 0, 'duplicate': 0, 'invalid': 0}
+    report.update({row['status']: row['count'] for row in cur.fetchall()})
+
+    cur.execute('''
+        SELECT line, status, reason
+        FROM account_import
+        WHERE status <> 'inserted'
+        ORDER BY line
+        LIMIT %s
+    ''', (REPORT_LIMIT,))
+    report['rows'] = cur.fetchall()
+    report['truncated'] = report['duplicate'] + report['invalid'] > len(report['rows'])
+    cur.close()
+    return report
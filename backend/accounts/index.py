@@ -1,47 +1,132 @@
 import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from http_cache import CACHE, etag_headers, is_not_modified, list_etag
+from timing import traced
+from response import JSON_HEADERS, NDJSON_HEADERS, dumps, json_response, ndjson, preflight, wants_ndjson
+from datetime import datetime
+import base64
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# В режиме NDJSON клиент выгружает список целиком, поэтому страница крупнее
+MAX_NDJSON_PAGE_SIZE = 10000
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+def encode_cursor(created_at: datetime, account_id: int) -> str:
+    '''Курсор следующей страницы: позиция последнего аккаунта в порядке (created_at, id)'''
+    raw = json.dumps([created_at.isoformat(), account_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    created_at, account_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(created_at), int(account_id)
+
+
+def import_format(event: dict):
+    '''Формат массового импорта: ?import=csv|ndjson или Content-Type тела запроса'''
+    query_params = event.get('queryStringParameters') or {}
+    if query_params.get('import'):
+        return query_params['import'].lower()
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type == 'text/csv':
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson'):
+        return 'ndjson'
+    return None
+
+
+def request_body(event: dict) -> str:
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+
+def open_cursor() -> tuple:
+    '''Соединение берём только после валидации запроса; psycopg2.extras грузится при первом обращении к базе'''
+    from psycopg2.extras import RealDictCursor
+    conn = get_connection()
+    return conn, conn.cursor(cursor_factory=RealDictCursor)
+
+
+@traced('accounts')
 def handler(event: dict, context) -> dict:
     '''API для управления Twitter аккаунтами'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
+        return preflight('GET, POST, PUT, DELETE, OPTIONS')
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         if method == 'GET':
-            cur.execute('''
-                SELECT id, username, avatar_url, is_active, created_at 
-                FROM accounts 
-                ORDER BY created_at DESC
-            ''')
+            query_params = event.get('queryStringParameters') or {}
+            stream = wants_ndjson(event)
+            
+            try:
+                max_page_size = MAX_NDJSON_PAGE_SIZE if stream else MAX_PAGE_SIZE
+                limit = max(1, min(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), max_page_size))
+                cursor = decode_cursor(query_params['cursor']) if query_params.get('cursor') else None
+            except (ValueError, TypeError):
+                return json_response(400, {'error': 'Invalid limit or cursor'})
+            
+            conn, cur = open_cursor()
+            etag = list_etag(cur, ('accounts',), dict(query_params, format='ndjson' if stream else 'json'))
+            if is_not_modified(event, etag):
+                return {'statusCode': 304, 'headers': etag_headers(etag), 'body': ''}
+            
+            cached = CACHE.get(etag)
+            if cached is not None:
+                return {'statusCode': 200, 'headers': cached[0], 'body': cached[1]}
+            
+            if cursor:
+                cur.execute('''
+                    SELECT id, username, avatar_url, is_active, created_at 
+                    FROM accounts 
+                    WHERE (created_at, id) < (%s, %s)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                ''', (*cursor, limit + 1))
+            else:
+                cur.execute('''
+                    SELECT id, username, avatar_url, is_active, created_at 
+                    FROM accounts 
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                ''', (limit + 1,))
             accounts = cur.fetchall()
             
-            for account in accounts:
-                if account['created_at']:
-                    account['created_at'] = account['created_at'].isoformat()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'accounts': accounts})
-            }
+            next_cursor = None
+            if len(accounts) > limit:
+                accounts = accounts[:limit]
+                next_cursor = encode_cursor(accounts[-1]['created_at'], accounts[-1]['id'])
+            
+            if stream:
+                # Курсор следующей страницы в NDJSON уходит заголовком, тело — только строки
+                headers = {**NDJSON_HEADERS, **etag_headers(etag), 'X-Next-Cursor': next_cursor or ''}
+                body = ndjson(accounts)
+            else:
+                headers = {**JSON_HEADERS, **etag_headers(etag)}
+                body = dumps({'accounts': accounts, 'nextCursor': next_cursor})
+            CACHE.put(etag, (headers, body))
+            
+            return {'statusCode': 200, 'headers': headers, 'body': body}
+        
+        elif method == 'POST' and import_format(event):
+            fmt = import_format(event)
+            if fmt not in IMPORT_FORMATS:
+                return json_response(400, {'error': 'Import format must be csv or ndjson'})
+            
+            from importer import import_accounts
+            
+            conn, cur = open_cursor()
+            report = import_accounts(conn, request_body(event), fmt)
+            conn.commit()
+            CACHE.clear()
+            
+            return json_response(200, report)
         
         elif method == 'POST':
             data = json.loads(event.get('body', '{}'))
@@ -50,12 +135,9 @@ def handler(event: dict, context) -> dict:
             avatar_url = data.get('avatarUrl', '')
             
             if not username or not auth_token:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Username and authToken are required'})
-                }
+                return json_response(400, {'error': 'Username and authToken are required'})
             
+            conn, cur = open_cursor()
             cur.execute('''
                 INSERT INTO accounts (username, auth_token, avatar_url)
                 VALUES (%s, %s, %s)
@@ -64,18 +146,9 @@ def handler(event: dict, context) -> dict:
             
             account = cur.fetchone()
             conn.commit()
+            CACHE.clear()
             
-            if account['created_at']:
-                account['created_at'] = account['created_at'].isoformat()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'account': account})
-            }
+            return json_response(201, {'account': account})
         
         elif method == 'PUT':
             data = json.loads(event.get('body', '{}'))
@@ -83,12 +156,9 @@ def handler(event: dict, context) -> dict:
             is_active = data.get('isActive')
             
             if not account_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Account ID is required'})
-                }
+                return json_response(400, {'error': 'Account ID is required'})
             
+            conn, cur = open_cursor()
             cur.execute('''
                 UPDATE accounts 
                 SET is_active = %s, updated_at = CURRENT_TIMESTAMP
@@ -98,43 +168,22 @@ def handler(event: dict, context) -> dict:
             
             account = cur.fetchone()
             conn.commit()
+            CACHE.clear()
             
             if not account:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Account not found'})
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'account': account})
-            }
+                return json_response(404, {'error': 'Account not found'})
+            
+            return json_response(200, {'account': account})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return json_response(405, {'error': 'Method not allowed'})
         
-    except psycopg2.IntegrityError as e:
-        return {
-            'statusCode': 409,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Account with this username already exists'})
-        }
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        # 23505 — нарушение уникальности; сравниваем код, чтобы не импортировать psycopg2 ради класса ошибки
+        if getattr(e, 'pgcode', None) == '23505':
+            return json_response(409, {'error': 'Account with this username already exists'})
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            release_connection(conn)
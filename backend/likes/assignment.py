@@ -0,0 +1,90 @@
+'''Распределение лайкеров по пачке постов за один проход в памяти.
+
+Счётчики аккаунтов лежат в массивах по плотному индексу: нагрузка за сутки (уже отданные сегодня
+лайки плюс назначенные в этой пачке) и баланс взаимности (получено минус отдано за окно сводки).
+Кандидаты стоят в куче по приоритету «нагрузка минус баланс»: аккаунт, которому лайкали больше,
+чем лайкал он сам, отдаёт долг раньше, а при равенстве лайк достаётся наименее загруженному.
+Автор, получивший лайки, сразу поднимается в очереди. Пара «лайкер — автор» в пределах пачки
+не повторяется, пока есть другие кандидаты. Записи кучи не удаляются при изменении счётчиков,
+а пропускаются по версии аккаунта.
+'''
+import heapq
+import random
+from array import array
+
+
+def assign_likers(posts: list, account_ids: list, given_today: dict, balance: dict, daily_cap: int,
+                  reciprocity: bool = True, rng: random.Random = None) -> list:
+    '''posts — [(post_id, author_id, сколько лайков)], возвращает [(post_id, account_id)].
+    given_today и balance — {account_id: число} только по аккаунтам с активностью; аккаунт,
+    набравший daily_cap лайков за сутки, больше не назначается. Без reciprocity баланс не учитывается'''
+    rng = rng or random
+    size = len(account_ids)
+    index = {account_id: i for i, account_id in enumerate(account_ids)}
+    load = array('i', bytes(4 * size))
+    debt = array('i', bytes(4 * size))
+    version = array('i', bytes(4 * size))
+
+    for account_id, count in given_today.items():
+        i = index.get(account_id)
+        if i is not None:
+            load[i] = count
+    if reciprocity:
+        for account_id, count in balance.items():
+            i = index.get(account_id)
+            if i is not None:
+                debt[i] = count
+
+    # Случайное второе поле перемешивает равных по приоритету кандидатов
+    heap = [(load[i] - debt[i], rng.random(), 0, i) for i in range(size) if load[i] < daily_cap]
+    heapq.heapify(heap)
+
+    assignments = []
+    # Пары лайкер-автор этой пачки как одно число: i * size + индекс автора
+    given_to = set()
+    for post_id, author_id, count in posts:
+        author = index.get(author_id)
+        held = []
+        picked = []
+        while len(picked) < count and heap:
+            entry = heapq.heappop(heap)
+            i = entry[3]
+            if entry[2] != version[i]:
+                continue
+            if i == author or (author is not None and i * size + author in given_to):
+                held.append(entry)
+                continue
+            picked.append(i)
+        # Повторную пару берём, только если других кандидатов не осталось
+        if len(picked) < count:
+            for entry in held:
+                if len(picked) == count:
+                    break
+                if entry[3] != author:
+                    picked.append(entry[3])
+        picked_set = set(picked)
+        for entry in held:
+            if entry[3] not in picked_set:
+                heapq.heappush(heap, entry)
+
+        for i in picked:
+            assignments.append((post_id, account_ids[i]))
+            if author is not None:
+                given_to.add(i * size + author)
+            load[i] += 1
+            if reciprocity:
+                debt[i] -= 1
+            version[i] += 1
+            if load[i] < daily_cap:
+                heapq.heappush(heap, (load[i] - debt[i], rng.random(), version[i], i))
+
+        if author is None:
+            continue
+        if reciprocity and picked:
+            # Прежняя запись автора, в куче или возвращённая из held, становится недействительной
+            debt[author] += len(picked)
+            version[author] += 1
+            if load[author] < daily_cap:
+                heapq.heappush(heap, (load[author] - debt[author], rng.random(), version[author], author))
+
+    return assignments
@@ -1,46 +1,274 @@
 import json
+from db import get_connection, release_connection
+from http_cache import CACHE, etag_headers, is_not_modified, list_etag
+from timing import traced
+from response import JSON_HEADERS, NDJSON_HEADERS, dumps, json_response, ndjson, preflight, wants_ndjson
+from assignment import assign_likers
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import random
+import time
+from datetime import date, timedelta
 
+MAX_BULK_POSTS = 1000
+# Потолок лайков одного аккаунта в сутки; по умолчанию — суточное пополнение ведра like в twitter/ratelimit.py
+DAILY_LIKE_CAP = int(os.environ.get('LIKES_DAILY_CAP', '1000'))
+# Окно сводки, по которому считается, кто кому должен лайки
+RECIPROCITY_DAYS = 7
+# Пачка до стольких лайков распределяется не по всему пулу, а по случайной выборке кандидатов:
+# одиночный POST остаётся O(лайков), а не O(активных аккаунтов)
+SAMPLED_MAX_LIKES = 500
+# Кандидатов в выборке на один лайк: запас на аккаунты у потолка, автора и повторные пары
+CANDIDATES_PER_LIKE = 4
+# Из них на один лайк — крупнейших должников по балансу взаимности; остальные добираются случайно
+DEBTORS_PER_LIKE = 2
+# Список должников читается агрегатом по сводке всех аккаунтов, поэтому контейнер держит его верхушку
+# столько секунд; счётчики самих кандидатов всё равно читаются на каждый запрос
+DEBTORS_TTL_SECONDS = 60
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+
+STATS_COLUMNS = ('likes_given', 'likes_done', 'likes_received', 'posts_scheduled', 'posts_published')
+
+
+# Активные аккаунты кэшируются на время жизни контейнера и перечитываются, когда accounts поднимает версию
+_active_accounts = {'version': None, 'ids': []}
+
+
+def active_account_ids(cur) -> list:
+    '''Массив id активных аккаунтов; на каждый запрос — только чтение версии по первичному ключу'''
+    cur.execute("SELECT version FROM cache_versions WHERE name = 'accounts'")
+    row = cur.fetchone()
+    version = row['version'] if row else 0
+    
+    if version != _active_accounts['version']:
+        cur.execute('SELECT id FROM accounts WHERE is_active = true')
+        _active_accounts['ids'] = [r['id'] for r in cur.fetchall()]
+        _active_accounts['version'] = version
+    
+    return _active_accounts['ids']
+
+
+# Месяц, для которого контейнер уже проверил секции likes
+_partitions_month = {'value': None}
+
+
+def ensure_partitions(cur) -> None:
+    '''Секции likes на несколько месяцев вперёд; функция в базе вызывается раз в месяц на контейнер'''
+    month = date.today().replace(day=1)
+    if _partitions_month['value'] != month:
+        cur.execute('SELECT ensure_likes_partitions()')
+        _partitions_month['value'] = month
+
+
+def insert_likes(cur, rows: list, is_mutual, since) -> list:
+    '''Вставляет (post_id, account_id, delay) одним запросом и возвращает созданные лайки.
+    Уникальный индекс (post_id, account_id) есть только внутри месячной секции, поэтому пары из прошлых
+    секций отсекает NOT EXISTS. since — самое раннее создание поста: лайков раньше не бывает,
+    и секции старше него планировщик не читает'''
+    if not rows:
+        return []
+    post_ids, account_ids, delays = zip(*rows)
+    cur.execute('''
+        INSERT INTO likes (post_id, account_id, is_mutual, delay_minutes)
+        SELECT v.post_id, v.account_id, %s, v.delay_minutes
+        FROM unnest(%s::int[], %s::int[], %s::int[]) AS v (post_id, account_id, delay_minutes)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM likes l
+            WHERE l.post_id = v.post_id AND l.account_id = v.account_id AND l.liked_at >= %s
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING id, post_id, liked_at, is_mutual, delay_minutes
+    ''', (is_mutual, list(post_ids), list(account_ids), list(delays), since))
+    return cur.fetchall()
+
+
+def like_counters(cur, account_ids=None) -> tuple:
+    '''Лайки, отданные сегодня, и баланс взаимности (получено минус отдано) за RECIPROCITY_DAYS дней
+    из сводки account_daily_stats; в ответе только аккаунты с активностью в этом окне.
+    account_ids ограничивает чтение кандидатами выборки, None — все аккаунты'''
+    only = '' if account_ids is None else 'account_id = ANY(%s) AND'
+    params = (RECIPROCITY_DAYS,) if account_ids is None else (account_ids, RECIPROCITY_DAYS)
+    cur.execute(f'''
+        SELECT account_id,
+               COALESCE(SUM(likes_given) FILTER (WHERE day = CURRENT_DATE), 0) AS given_today,
+               SUM(likes_received) - SUM(likes_given) AS balance
+        FROM account_daily_stats
+        WHERE {only} day > CURRENT_DATE - %s
+        GROUP BY account_id
+    ''', params)
+    given_today = {}
+    balance = {}
+    for row in cur:
+        given_today[row['account_id']] = row['given_today']
+        balance[row['account_id']] = row['balance']
+    return given_today, balance
+
+
+# Верхушка должников на контейнер: до SAMPLED_MAX_LIKES * DEBTORS_PER_LIKE id и момент чтения
+_debtors = {'loaded_at': None, 'ids': []}
+
+
+def top_debtors(cur, limit: int) -> list:
+    '''limit случайных аккаунтов из верхушки должников: активных, которым за RECIPROCITY_DAYS дней лайкнули
+    больше, чем лайкнули они сами'''
+    now = time.monotonic()
+    if _debtors['loaded_at'] is None or now - _debtors['loaded_at'] > DEBTORS_TTL_SECONDS:
+        _debtors['ids'] = load_debtors(cur, SAMPLED_MAX_LIKES * DEBTORS_PER_LIKE)
+        _debtors['loaded_at'] = now
+    # Случайная часть верхушки, а не её начало: иначе все запросы до обновления списка получали бы
+    # одних и тех же должников, пока те не упрутся в суточный потолок
+    ids = _debtors['ids']
+    return random.sample(ids, min(limit, len(ids)))
+
+
+def load_debtors(cur, limit: int) -> list:
+    '''До limit крупнейших должников, от самых крупных долгов'''
+    cur.execute('''
+        SELECT s.account_id
+        FROM account_daily_stats s
+        JOIN accounts a ON a.id = s.account_id AND a.is_active = true
+        WHERE s.day > CURRENT_DATE - %s
+        GROUP BY s.account_id
+        HAVING SUM(s.likes_received) - SUM(s.likes_given) > 0
+        ORDER BY SUM(s.likes_received) - SUM(s.likes_given) DESC
+        LIMIT %s
+    ''', (RECIPROCITY_DAYS, limit))
+    return [row['account_id'] for row in cur.fetchall()]
+
+
+def sample_candidates(cur, account_ids: list, size: int, reciprocity: bool) -> list:
+    '''Выборка кандидатов за O(size): сначала должники из закэшированной верхушки, чтобы взаимность работала
+    и на малых пачках, затем случайные активные аккаунты до size'''
+    candidates = top_debtors(cur, size * DEBTORS_PER_LIKE // CANDIDATES_PER_LIKE) if reciprocity else []
+    seen = set(candidates)
+    for account_id in random.sample(account_ids, size):
+        if len(candidates) == size:
+            break
+        if account_id not in seen:
+            candidates.append(account_id)
+            seen.add(account_id)
+    return candidates
+
+
+def assign_likes(cur, posts: list, is_mutual) -> list:
+    '''(post_id, account_id, задержка 5–15 минут) для пачки [(post_id, author_id, count)].
+    Небольшая пачка распределяется по выборке кандидатов (должники плюс случайные аккаунты) со счётчиками
+    только этих кандидатов; большая — по всему пулу активных аккаунтов'''
+    account_ids = active_account_ids(cur)
+    total = sum(count for _, _, count in posts)
+    candidates = None
+    if 0 <= total <= SAMPLED_MAX_LIKES and total * CANDIDATES_PER_LIKE < len(account_ids):
+        candidates = account_ids = sample_candidates(cur, account_ids, total * CANDIDATES_PER_LIKE, bool(is_mutual))
+    given_today, balance = like_counters(cur, candidates)
+    pairs = assign_likers(posts, account_ids, given_today, balance, DAILY_LIKE_CAP, reciprocity=bool(is_mutual))
+    return [(post_id, account_id, random.randint(5, 15)) for post_id, account_id in pairs]
+
+
+def is_count(value, minimum: int = 0) -> bool:
+    '''Целое не меньше minimum числом или строкой из цифр; bool и дробные не подходят'''
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return value >= minimum
+    return isinstance(value, str) and value.isdigit() and int(value) >= minimum
+
+
+def stats_range(query_params: dict) -> tuple:
+    '''Диапазон дней сводки: по умолчанию последние DEFAULT_STATS_DAYS дней, включая сегодня'''
+    end = date.fromisoformat(query_params['to']) if query_params.get('to') else date.today()
+    start = date.fromisoformat(query_params['from']) if query_params.get('from') else end - timedelta(days=DEFAULT_STATS_DAYS - 1)
+    if start > end or (end - start).days >= MAX_STATS_DAYS:
+        raise ValueError('invalid range')
+    return start, end
+
+
+def daily_stats(cur, account_id, start: date, end: date) -> dict:
+    '''Активность по дням из account_daily_stats: объём чтения зависит от диапазона, а не от истории лайков'''
+    sums = ', '.join(f'SUM({column}) AS {column}' for column in STATS_COLUMNS)
+    if account_id is not None:
+        cur.execute(f'''
+            SELECT day, {', '.join(STATS_COLUMNS)}
+            FROM account_daily_stats
+            WHERE account_id = %s AND day BETWEEN %s AND %s
+            ORDER BY day
+        ''', (account_id, start, end))
+    else:
+        cur.execute(f'''
+            SELECT day, {sums}
+            FROM account_daily_stats
+            WHERE day BETWEEN %s AND %s
+            GROUP BY day
+            ORDER BY day
+        ''', (start, end))
+    days = cur.fetchall()
+    totals = {column: sum(row[column] for row in days) for column in STATS_COLUMNS}
+    return {'accountId': account_id, 'from': start, 'to': end, 'days': days, 'totals': totals}
+
+
+def open_cursor() -> tuple:
+    '''Соединение берём только после валидации запроса; psycopg2.extras грузится при первом обращении к базе'''
+    from psycopg2.extras import RealDictCursor
+    conn = get_connection()
+    return conn, conn.cursor(cursor_factory=RealDictCursor)
+
+
+@traced('likes')
 def handler(event: dict, context) -> dict:
     '''API для управления лайками постов'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
+        return preflight('GET, POST, OPTIONS')
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         if method == 'GET':
             query_params = event.get('queryStringParameters') or {}
             post_id = query_params.get('postId')
+            stream = wants_ndjson(event)
+            
+            if query_params.get('view') == 'stats':
+                try:
+                    account_id = int(query_params['accountId']) if query_params.get('accountId') else None
+                    start, end = stats_range(query_params)
+                except ValueError:
+                    return json_response(400, {'error': f'accountId must be a number, from/to dates in YYYY-MM-DD within {MAX_STATS_DAYS} days'})
+                
+                conn, cur = open_cursor()
+                # Сводку меняют триггеры likes и posts и пересчёт rebuildStats со своей версией
+                etag = list_etag(cur, ('account_daily_stats', 'likes', 'posts'), dict(query_params, start=str(start), end=str(end)))
+                if is_not_modified(event, etag):
+                    return {'statusCode': 304, 'headers': etag_headers(etag), 'body': ''}
+                
+                cached = CACHE.get(etag)
+                if cached is None:
+                    cached = ({**JSON_HEADERS, **etag_headers(etag)}, dumps(daily_stats(cur, account_id, start, end)))
+                    CACHE.put(etag, cached)
+                return {'statusCode': 200, 'headers': cached[0], 'body': cached[1]}
+            
+            conn, cur = open_cursor()
+            etag = list_etag(cur, ('accounts', 'likes', 'posts'), dict(query_params, format='ndjson' if stream else 'json'))
+            if is_not_modified(event, etag):
+                return {'statusCode': 304, 'headers': etag_headers(etag), 'body': ''}
+            
+            cached = CACHE.get(etag)
+            if cached is not None:
+                return {'statusCode': 200, 'headers': cached[0], 'body': cached[1]}
             
             if post_id:
                 cur.execute('''
                     SELECT 
-                        l.id, l.liked_at, l.is_mutual, l.delay_minutes,
+                        l.id, l.liked_at, l.is_mutual, l.delay_minutes, l.status,
                         a.username, a.avatar_url
                     FROM likes l
                     JOIN accounts a ON l.account_id = a.id
                     WHERE l.post_id = %s
+                      AND l.liked_at >= (SELECT COALESCE(created_at, '-infinity') FROM posts WHERE id = %s)
                     ORDER BY l.liked_at ASC
-                ''', (post_id,))
+                ''', (post_id, post_id))
             else:
                 cur.execute('''
                     SELECT 
-                        l.id, l.post_id, l.liked_at, l.is_mutual, l.delay_minutes,
+                        l.id, l.post_id, l.liked_at, l.is_mutual, l.delay_minutes, l.status,
                         a.username, a.avatar_url,
                         p.content as post_content
                     FROM likes l
@@ -50,100 +278,141 @@ def handler(event: dict, context) -> dict:
                     LIMIT 100
                 ''')
             
-            likes = cur.fetchall()
-            
-            for like in likes:
-                if like['liked_at']:
-                    like['liked_at'] = like['liked_at'].isoformat()
+            if stream:
+                headers = {**NDJSON_HEADERS, **etag_headers(etag)}
+                body = ndjson(cur)
+            else:
+                headers = {**JSON_HEADERS, **etag_headers(etag)}
+                body = dumps({'likes': cur.fetchall()})
+            CACHE.put(etag, (headers, body))
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'likes': likes})
-            }
+            return {'statusCode': 200, 'headers': headers, 'body': body}
         
         elif method == 'POST':
             data = json.loads(event.get('body', '{}'))
+            
+            # Пересчёт сводки по истории: после ручных правок в базе или для дозаполнения
+            if data.get('action') == 'rebuildStats':
+                try:
+                    since = date.fromisoformat(data['from']) if data.get('from') else None
+                except (ValueError, TypeError):
+                    return json_response(400, {'error': 'from must be a date in YYYY-MM-DD'})
+                
+                conn, cur = open_cursor()
+                cur.execute('SELECT rebuild_account_daily_stats(%s) AS rows', (since,))
+                rebuilt = cur.fetchone()['rows']
+                # Пересчёт меняет сводку в обход триггеров likes и posts: поднимаем её собственную версию для ETag
+                cur.execute('''
+                    INSERT INTO cache_versions (name) VALUES ('account_daily_stats')
+                    ON CONFLICT (name) DO UPDATE
+                    SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+                ''')
+                conn.commit()
+                CACHE.clear()
+                
+                return json_response(200, {'rebuilt': rebuilt, 'from': since})
+            
+            # Массовый режим: лайки для многих постов одной многострочной вставкой
+            if 'posts' in data:
+                items = data.get('posts') or []
+                is_mutual = data.get('isMutual', True)
+                
+                if (not isinstance(items, list) or not items or len(items) > MAX_BULK_POSTS
+                        or not all(
+                            isinstance(item, dict) and is_count(item.get('postId'), 1)
+                            and is_count(item.get('likesCount', 2))
+                            for item in items
+                        )):
+                    return json_response(400, {
+                        'error': f'posts must contain from 1 to {MAX_BULK_POSTS} objects with numeric postId '
+                                 'and non-negative integer likesCount'
+                    })
+                
+                items = [{'postId': int(item['postId']), 'likesCount': int(item.get('likesCount', 2))} for item in items]
+                
+                from psycopg2.extras import execute_values
+                
+                conn, cur = open_cursor()
+                post_ids = list({item['postId'] for item in items})
+                # Посты блокируем до вставки лайков и по порядку id: триггер сводки на likes берёт строки
+                # account_daily_stats, а диспетчер, обновляя посты, берёт сначала пост, потом сводку.
+                # Тот же порядок «пост, потом сводка» исключает взаимную блокировку
+                cur.execute('''
+                    SELECT id, account_id, COALESCE(created_at, '-infinity') AS created_at
+                    FROM posts WHERE id = ANY(%s)
+                    ORDER BY id
+                    FOR NO KEY UPDATE
+                ''', (post_ids,))
+                posts = cur.fetchall()
+                authors = {row['id']: row['account_id'] for row in posts}
+                missing = [post_id for post_id in post_ids if post_id not in authors]
+                
+                if missing:
+                    return json_response(404, {'error': 'Post not found', 'missing': missing})
+                
+                ensure_partitions(cur)
+                rows = assign_likes(cur, [(item['postId'], authors[item['postId']], item['likesCount']) for item in items], is_mutual)
+                created = insert_likes(cur, rows, is_mutual, min(row['created_at'] for row in posts))
+                
+                likes_by_post = {}
+                for like in created:
+                    likes_by_post.setdefault(str(like['post_id']), []).append(like)
+                
+                # Счётчики всех постов обновляем одним UPDATE в той же транзакции
+                if likes_by_post:
+                    execute_values(cur, '''
+                        UPDATE posts AS p
+                        SET likes_count = p.likes_count + v.added
+                        FROM (VALUES %s) AS v (id, added)
+                        WHERE p.id = v.id
+                    ''', [(int(post_id), len(likes)) for post_id, likes in likes_by_post.items()])
+                
+                conn.commit()
+                CACHE.clear()
+                
+                return json_response(201, {'likes': likes_by_post, 'count': len(created)})
+            
             post_id = data.get('postId')
             likes_count = data.get('likesCount', 2)
             is_mutual = data.get('isMutual', True)
             
             if not post_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'postId is required'})
-                }
+                return json_response(400, {'error': 'postId is required'})
+            if not is_count(post_id, 1) or not is_count(likes_count):
+                return json_response(400, {'error': 'postId must be a number and likesCount a non-negative integer'})
             
-            cur.execute('SELECT account_id FROM posts WHERE id = %s', (post_id,))
+            conn, cur = open_cursor()
+            # Пост блокируем до вставки лайков, как и в массовом режиме: сначала пост, потом сводка
+            cur.execute('''
+                SELECT account_id, COALESCE(created_at, '-infinity') AS created_at FROM posts WHERE id = %s
+                FOR NO KEY UPDATE
+            ''', (post_id,))
             post = cur.fetchone()
             
             if not post:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Post not found'})
-                }
-            
-            post_author_id = post['account_id']
+                return json_response(404, {'error': 'Post not found'})
             
-            cur.execute('''
-                SELECT id FROM accounts 
-                WHERE is_active = true AND id != %s
-                ORDER BY RANDOM()
-                LIMIT %s
-            ''', (post_author_id, likes_count))
-            
-            accounts = cur.fetchall()
-            created_likes = []
+            ensure_partitions(cur)
+            rows = assign_likes(cur, [(int(post_id), post['account_id'], int(likes_count))], is_mutual)
+            created_likes = insert_likes(cur, rows, is_mutual, post['created_at'])
             
-            for account in accounts:
-                delay = random.randint(5, 15)
-                
+            # Счётчик на посте обновляем в той же транзакции, что и вставку лайков
+            if created_likes:
                 cur.execute('''
-                    INSERT INTO likes (post_id, account_id, is_mutual, delay_minutes)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (post_id, account_id) DO NOTHING
-                    RETURNING id, liked_at, is_mutual, delay_minutes
-                ''', (post_id, account['id'], is_mutual, delay))
-                
-                like = cur.fetchone()
-                if like:
-                    if like['liked_at']:
-                        like['liked_at'] = like['liked_at'].isoformat()
-                    created_likes.append(like)
+                    UPDATE posts SET likes_count = likes_count + %s WHERE id = %s
+                ''', (len(created_likes), post_id))
             
             conn.commit()
+            CACHE.clear()
             
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'likes': created_likes,
-                    'count': len(created_likes)
-                })
-            }
+            return json_response(201, {'likes': created_likes, 'count': len(created_likes)})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return json_response(405, {'error': 'Method not allowed'})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            release_connection(conn)
@@ -0,0 +1,84 @@
+'''Ротация секций likes: создаёт секции наперёд, отсоединяет месяцы старше срока хранения
+и выгружает их в сжатые CSV на локальный диск, после чего удаляет таблицы из базы.
+
+Запускается по расписанию с машины, где лежит архив:
+    DATABASE_URL=... python backend/likes/retention.py --archive-dir /var/backups/likes --keep-months 12
+
+Отсоединённая, но не заархивированная секция (упал диск, прервался запуск) подхватывается следующим
+запуском. Сводка account_daily_stats архивные месяцы помнит; rebuild_account_daily_stats с from
+раньше срока хранения их обнулит.
+'''
+import argparse
+import gzip
+import json
+import os
+
+from db import get_connection, release_connection
+
+DEFAULT_KEEP_MONTHS = int(os.environ.get('LIKES_RETENTION_MONTHS', '12'))
+
+
+def detached_partitions(cur) -> list:
+    '''Таблицы секций likes, которые уже не входят в секционированную таблицу'''
+    cur.execute(r'''
+        SELECT relname
+        FROM pg_class
+        WHERE relnamespace = current_schema()::regnamespace
+          AND relkind = 'r'
+          AND NOT relispartition
+          AND relname ~ '^likes_p\d{4}_\d{2}$'
+        ORDER BY relname
+    ''')
+    return [row[0] for row in cur.fetchall()]
+
+
+def archive_partition(conn, name: str, directory: str) -> dict:
+    '''Выгружает таблицу в <name>.csv.gz и удаляет её; файл появляется под итоговым именем только целиком'''
+    path = os.path.join(directory, f'{name}.csv.gz')
+    partial = path + '.partial'
+    cur = conn.cursor()
+    with gzip.open(partial, 'wb') as f:
+        cur.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', f)
+    rows = cur.rowcount
+    with open(partial, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+    cur.execute(f'DROP TABLE {name}')
+    conn.commit()
+    cur.close()
+    return {'table': name, 'rows': rows, 'file': path, 'bytes': os.path.getsize(path)}
+
+
+def rotate(conn, directory: str, keep_months: int) -> dict:
+    cur = conn.cursor()
+    cur.execute('SELECT ensure_likes_partitions()')
+    created = cur.fetchone()[0]
+    cur.execute('SELECT detach_old_likes_partitions(%s)', (keep_months,))
+    detached = [row[0] for row in cur.fetchall()]
+    conn.commit()
+
+    archived = [archive_partition(conn, name, directory) for name in detached_partitions(cur)]
+    cur.close()
+    return {'created': created, 'detached': detached, 'archived': archived}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive-dir', required=True)
+    parser.add_argument('--keep-months', type=int, default=DEFAULT_KEEP_MONTHS)
+    args = parser.parse_args()
+
+    if args.keep_months < 1:
+        parser.error('--keep-months must be at least 1')
+    os.makedirs(args.archive_dir, exist_ok=True)
+
+    conn = get_connection()
+    try:
+        print(json.dumps(rotate(conn, args.archive_dir, args.keep_months), ensure_ascii=False))
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
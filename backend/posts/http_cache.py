@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+# Сколько готовых ответов держит контейнер и сколько секунд они живут
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '30'))
+
+
+class ResponseCache:
+    '''LRU готовых ответов GET (заголовки и тело) по ETag; ETag уже включает версии таблиц, поэтому устаревшая запись просто не находится'''
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # etag -> (ответ, момент истечения)
+        self._entries = OrderedDict()
+
+    def get(self, etag: str):
+        entry = self._entries.get(etag)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._entries[etag]
+            return None
+        self._entries.move_to_end(etag)
+        return entry[0]
+
+    def put(self, etag: str, response) -> None:
+        self._entries[etag] = (response, time.monotonic() + self.ttl)
+        self._entries.move_to_end(etag)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+CACHE = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+
+def list_etag(cur, tables: tuple, query_params: dict) -> str:
+    '''ETag списка: версии таблиц из cache_versions (их поднимают триггеры) плюс параметры запроса'''
+    cur.execute('SELECT name, version FROM cache_versions WHERE name = ANY(%s) ORDER BY name', (list(tables),))
+    versions = [[row['name'], row['version']] for row in cur.fetchall()]
+    raw = json.dumps([versions, sorted((query_params or {}).items())])
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:24] + '"'
+
+
+def is_not_modified(event: dict, etag: str) -> bool:
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    value = headers.get('if-none-match')
+    if not value:
+        return False
+    tags = [tag.strip() for tag in value.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
+
+
+def etag_headers(etag: str) -> dict:
+    # no-cache: браузер хранит ответ, но каждый раз переспрашивает с If-None-Match
+    return {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Access-Control-Expose-Headers': 'ETag, X-Next-Cursor',
+        'Access-Control-Allow-Origin': '*'
+    }
@@ -0,0 +1,173 @@
+from datetime import datetime, timezone
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+
+def parse_time(value):
+    '''ISO-время из календаря; время без зоны считаем UTC, мусор — None'''
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_account_id(value):
+    if value is None or value == '':
+        return None, True
+    try:
+        return int(value), True
+    except (TypeError, ValueError):
+        return None, False
+
+
+def parse_text(value):
+    '''Текстовое поле строки календаря: None допустим, не строка (объект, список, число) — ошибка строки'''
+    if value is None or isinstance(value, str):
+        return value, True
+    return None, False
+
+
+def staged_rows(items: list) -> list:
+    rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            rows.append((index, None, False, None, True, None, True, None, True, None, False))
+            continue
+        account_id, account_ok = parse_account_id(item.get('accountId'))
+        content, content_ok = parse_text(item.get('content'))
+        video_url, video_url_ok = parse_text(item.get('videoUrl'))
+        video_name, video_name_ok = parse_text(item.get('videoName'))
+        scheduled_time = parse_time(item.get('scheduledTime'))
+        rows.append((
+            index, account_id, account_ok, content, content_ok, video_url, video_url_ok, video_name, video_name_ok,
+            scheduled_time, scheduled_time is not None
+        ))
+    return rows
+
+
+def import_schedule(conn, items: list) -> dict:
+    '''Проверяет весь календарь множественными запросами по staging-таблице и одной вставкой
+    создаёт посты из корректных строк; всё в одной транзакции вызывающего'''
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute('''
+        CREATE TEMP TABLE post_import (
+            index INTEGER PRIMARY KEY,
+            account_id INTEGER,
+            account_ok BOOLEAN NOT NULL,
+            content TEXT,
+            content_ok BOOLEAN NOT NULL,
+            video_url TEXT,
+            video_url_ok BOOLEAN NOT NULL,
+            video_name TEXT,
+            video_name_ok BOOLEAN NOT NULL,
+            scheduled_time TIMESTAMPTZ,
+            time_ok BOOLEAN NOT NULL,
+            errors TEXT[] NOT NULL DEFAULT '{}'
+        ) ON COMMIT DROP
+    ''')
+    execute_values(cur, '''
+        INSERT INTO post_import (
+            index, account_id, account_ok, content, content_ok, video_url, video_url_ok, video_name, video_name_ok,
+            scheduled_time, time_ok
+        )
+        VALUES %s
+    ''', staged_rows(items), page_size=1000)
+
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'invalid accountId')
+        WHERE NOT account_ok
+    ''')
+    cur.execute('''
+        UPDATE post_import AS i
+        SET errors = array_append(i.errors, 'unknown account')
+        WHERE i.account_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM accounts a WHERE a.id = i.account_id)
+    ''')
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'invalid content')
+        WHERE NOT content_ok
+    ''')
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'empty content')
+        WHERE content_ok AND (content IS NULL OR btrim(content) = '')
+    ''')
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'invalid videoUrl')
+        WHERE NOT video_url_ok
+    ''')
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'invalid videoName')
+        WHERE NOT video_name_ok
+    ''')
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'invalid scheduledTime')
+        WHERE NOT time_ok
+    ''')
+    cur.execute('''
+        UPDATE post_import
+        SET errors = array_append(errors, 'scheduledTime in the past')
+        WHERE scheduled_time <= CURRENT_TIMESTAMP
+    ''')
+    # Слот аккаунта занят другой строкой календаря (первая корректная побеждает) или уже запланированным постом.
+    # За слот соревнуются только строки без ошибок: строка, которая всё равно не создастся, слот не занимает
+    cur.execute('''
+        UPDATE post_import AS i
+        SET errors = array_append(i.errors, 'duplicate slot in file')
+        FROM (
+            SELECT index, row_number() OVER (
+                PARTITION BY account_id, scheduled_time ORDER BY index
+            ) AS n
+            FROM post_import
+            WHERE scheduled_time IS NOT NULL AND errors = '{}'
+        ) AS d
+        WHERE i.index = d.index AND d.n > 1
+    ''')
+    cur.execute('''
+        UPDATE post_import AS i
+        SET errors = array_append(i.errors, 'slot already scheduled')
+        WHERE EXISTS (
+            SELECT 1 FROM posts p
+            WHERE p.account_id IS NOT DISTINCT FROM i.account_id
+              AND p.scheduled_time = i.scheduled_time
+              AND p.status <> 'failed'
+        )
+    ''')
+
+    cur.execute('''
+        WITH created AS (
+            INSERT INTO posts (account_id, content, video_url, video_name, scheduled_time)
+            SELECT account_id, content, video_url, video_name, scheduled_time
+            FROM post_import
+            WHERE errors = '{}'
+            ORDER BY index
+            RETURNING id, account_id, scheduled_time
+        )
+        SELECT i.index, created.id
+        FROM created
+        JOIN post_import i
+          ON i.account_id IS NOT DISTINCT FROM created.account_id
+         AND i.scheduled_time = created.scheduled_time
+         AND i.errors = '{}'
+        ORDER BY i.index
+    ''')
+    created = cur.fetchall()
+
+    cur.execute('''
+        SELECT index, errors
+        FROM post_import
+        WHERE errors <> '{}'
+        ORDER BY index
+    ''')
+    invalid = cur.fetchall()
+    cur.close()
+
+    return {'created': created, 'invalid': invalid}
@@ -1,60 +1,149 @@
 import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from db import get_connection, release_connection
+from http_cache import CACHE, etag_headers, is_not_modified, list_etag
+from timing import traced
+from response import JSON_HEADERS, NDJSON_HEADERS, dumps, json_response, ndjson, preflight, wants_ndjson
+from datetime import datetime, timezone
+import base64
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# В режиме NDJSON клиент выгружает список целиком, поэтому страница крупнее
+MAX_NDJSON_PAGE_SIZE = 10000
+MAX_IMPORT_ROWS = 5000
+
+
+def encode_cursor(scheduled_time: datetime, post_id: int) -> str:
+    '''Курсор следующей страницы: позиция последнего поста в порядке (scheduled_time, id)'''
+    raw = json.dumps([scheduled_time.isoformat(), post_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    scheduled_time, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(scheduled_time), int(post_id)
+
+
+def parse_filter_time(value: str) -> datetime:
+    '''Граница from/to: ISO-время, время без зоны считаем UTC; в запрос уходит UTC без зоны, как scheduled_time'''
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def open_cursor() -> tuple:
+    '''Соединение берём только после валидации запроса; psycopg2.extras грузится при первом обращении к базе'''
+    from psycopg2.extras import RealDictCursor
+    conn = get_connection()
+    return conn, conn.cursor(cursor_factory=RealDictCursor)
+
+
+@traced('posts')
 def handler(event: dict, context) -> dict:
     '''API для управления постами Twitter'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
+        return preflight('GET, POST, PUT, OPTIONS')
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         if method == 'GET':
-            cur.execute('''
+            query_params = event.get('queryStringParameters') or {}
+            stream = wants_ndjson(event)
+            
+            try:
+                max_page_size = MAX_NDJSON_PAGE_SIZE if stream else MAX_PAGE_SIZE
+                limit = max(1, min(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), max_page_size))
+                cursor = decode_cursor(query_params['cursor']) if query_params.get('cursor') else None
+                account_id = int(query_params['accountId']) if query_params.get('accountId') else None
+                time_from = parse_filter_time(query_params['from']) if query_params.get('from') else None
+                time_to = parse_filter_time(query_params['to']) if query_params.get('to') else None
+            except (ValueError, TypeError):
+                return json_response(400, {'error': 'Invalid limit, cursor, accountId or from/to'})
+            
+            conn, cur = open_cursor()
+            
+            # Список постов подтягивает username из accounts и метрики из post_metrics, поэтому зависит от всех трёх таблиц
+            etag = list_etag(cur, ('accounts', 'posts', 'post_metrics'), dict(query_params, format='ndjson' if stream else 'json'))
+            if is_not_modified(event, etag):
+                return {'statusCode': 304, 'headers': etag_headers(etag), 'body': ''}
+            
+            cached = CACHE.get(etag)
+            if cached is not None:
+                return {'statusCode': 200, 'headers': cached[0], 'body': cached[1]}
+            
+            conditions = []
+            params = []
+            if query_params.get('status'):
+                conditions.append('p.status = %s')
+                params.append(query_params['status'])
+            if account_id is not None:
+                conditions.append('p.account_id = %s')
+                params.append(account_id)
+            if time_from is not None:
+                conditions.append('p.scheduled_time >= %s')
+                params.append(time_from)
+            if time_to is not None:
+                conditions.append('p.scheduled_time < %s')
+                params.append(time_to)
+            if cursor:
+                conditions.append('(p.scheduled_time, p.id) < (%s, %s)')
+                params.extend(cursor)
+            
+            where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+            
+            cur.execute(f'''
                 SELECT 
                     p.id, p.content, p.video_url, p.video_name,
                     p.scheduled_time, p.published_at, p.status,
                     p.twitter_post_id, p.created_at,
+                    p.likes_count,
                     a.username as account_username,
-                    COUNT(l.id) as likes_count
+                    m.like_count as twitter_likes,
+                    m.retweet_count as twitter_retweets,
+                    m.reply_count as twitter_replies,
+                    m.view_count as twitter_views,
+                    m.synced_at as metrics_synced_at
                 FROM posts p
                 LEFT JOIN accounts a ON p.account_id = a.id
-                LEFT JOIN likes l ON p.id = l.post_id
-                GROUP BY p.id, a.username
-                ORDER BY p.scheduled_time DESC
-            ''')
+                LEFT JOIN post_metrics m ON m.post_id = p.id
+                {where}
+                ORDER BY p.scheduled_time DESC, p.id DESC
+                LIMIT %s
+            ''', (*params, limit + 1))
             posts = cur.fetchall()
             
-            for post in posts:
-                if post['scheduled_time']:
-                    post['scheduled_time'] = post['scheduled_time'].isoformat()
-                if post['published_at']:
-                    post['published_at'] = post['published_at'].isoformat()
-                if post['created_at']:
-                    post['created_at'] = post['created_at'].isoformat()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'posts': posts})
-            }
+            next_cursor = None
+            if len(posts) > limit:
+                posts = posts[:limit]
+                next_cursor = encode_cursor(posts[-1]['scheduled_time'], posts[-1]['id'])
+            
+            if stream:
+                # Курсор следующей страницы в NDJSON уходит заголовком, тело — только строки
+                headers = {**NDJSON_HEADERS, **etag_headers(etag), 'X-Next-Cursor': next_cursor or ''}
+                body = ndjson(posts)
+            else:
+                headers = {**JSON_HEADERS, **etag_headers(etag)}
+                body = dumps({'posts': posts, 'nextCursor': next_cursor})
+            CACHE.put(etag, (headers, body))
+            
+            return {'statusCode': 200, 'headers': headers, 'body': body}
+        
+        elif method == 'POST' and 'posts' in json.loads(event.get('body') or '{}'):
+            items = json.loads(event['body'])['posts']
+            
+            if not isinstance(items, list) or not items or len(items) > MAX_IMPORT_ROWS:
+                return json_response(400, {'error': f'posts must be a non-empty array of at most {MAX_IMPORT_ROWS} items'})
+            
+            from importer import import_schedule
+            
+            conn, cur = open_cursor()
+            report = import_schedule(conn, items)
+            conn.commit()
+            CACHE.clear()
+            
+            return json_response(200, report)
         
         elif method == 'POST':
             data = json.loads(event.get('body', '{}'))
@@ -65,12 +154,9 @@ def handler(event: dict, context) -> dict:
             scheduled_time = data.get('scheduledTime')
             
             if not content or not scheduled_time:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Content and scheduledTime are required'})
-                }
+                return json_response(400, {'error': 'Content and scheduledTime are required'})
             
+            conn, cur = open_cursor()
             cur.execute('''
                 INSERT INTO posts (account_id, content, video_url, video_name, scheduled_time)
                 VALUES (%s, %s, %s, %s, %s)
@@ -79,20 +165,9 @@ def handler(event: dict, context) -> dict:
             
             post = cur.fetchone()
             conn.commit()
+            CACHE.clear()
             
-            if post['scheduled_time']:
-                post['scheduled_time'] = post['scheduled_time'].isoformat()
-            if post['created_at']:
-                post['created_at'] = post['created_at'].isoformat()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'post': post})
-            }
+            return json_response(201, {'post': post})
         
         elif method == 'PUT':
             data = json.loads(event.get('body', '{}'))
@@ -101,14 +176,11 @@ def handler(event: dict, context) -> dict:
             twitter_post_id = data.get('twitterPostId')
             
             if not post_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Post ID is required'})
-                }
+                return json_response(400, {'error': 'Post ID is required'})
             
             published_at = 'CURRENT_TIMESTAMP' if status == 'published' else 'NULL'
             
+            conn, cur = open_cursor()
             cur.execute(f'''
                 UPDATE posts 
                 SET status = %s, 
@@ -121,40 +193,19 @@ def handler(event: dict, context) -> dict:
             
             post = cur.fetchone()
             conn.commit()
+            CACHE.clear()
             
             if not post:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Post not found'})
-                }
-            
-            if post.get('published_at'):
-                post['published_at'] = post['published_at'].isoformat()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'post': post})
-            }
+                return json_response(404, {'error': 'Post not found'})
+            
+            return json_response(200, {'post': post})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return json_response(405, {'error': 'Method not allowed'})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            release_connection(conn)
@@ -0,0 +1,70 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from timing import span
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+NDJSON_HEADERS = {'Content-Type': 'application/x-ndjson', 'Access-Control-Allow-Origin': '*'}
+
+
+def preflight(methods: str) -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
+        },
+        'body': ''
+    }
+
+
+def encode_value(value):
+    '''Типы из строк курсора, которые json не знает сам; вызывается только для них'''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(payload) -> str:
+        '''Строки RealDictCursor в JSON как есть: datetime сериализует orjson, Decimal — encode_value'''
+        with span('serialize'):
+            return orjson.dumps(payload, default=encode_value).decode()
+
+    def dump_line(row) -> bytes:
+        return orjson.dumps(row, default=encode_value, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    def dumps(payload) -> str:
+        '''Строки RealDictCursor в JSON как есть: datetime и Decimal кодирует encode_value'''
+        with span('serialize'):
+            return json.dumps(payload, default=encode_value)
+
+    def dump_line(row) -> bytes:
+        return (json.dumps(row, default=encode_value) + '\n').encode()
+
+
+def ndjson(rows) -> str:
+    '''Тело NDJSON: по строке JSON на запись, без промежуточного списка словарей'''
+    with span('serialize'):
+        return b''.join(dump_line(row) for row in rows).decode()
+
+
+def wants_ndjson(event: dict) -> bool:
+    query_params = event.get('queryStringParameters') or {}
+    if query_params.get('format') == 'ndjson':
+        return True
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    return 'application/x-ndjson' in headers.get('accept', '')
+
+
+def json_response(status: int, payload, headers: dict = None) -> dict:
+    return {'statusCode': status, 'headers': headers or JSON_HEADERS, 'body': dumps(payload)}
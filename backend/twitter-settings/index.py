@@ -1,8 +1,11 @@
 import json
 import os
-import psycopg2
 
+from db import get_connection, release_connection
+from timing import traced
 
+
+@traced('twitter-settings')
 def handler(event: dict, context) -> dict:
     '''API для управления данными для входа в Twitter: сохранение username и password'''
     
@@ -28,7 +31,40 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'Database not configured'})
         }
     
-    conn = psycopg2.connect(dsn)
+    # Ошибки в запросе отвечаем до подключения к базе
+    if method == 'POST':
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Invalid JSON',
+                    'message': 'Тело запроса должно быть JSON'
+                })
+            }
+        
+        username = body.get('username', '').strip()
+        password = body.get('password', '').strip()
+        
+        if not username or not password:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Username and password required',
+                    'message': 'Username и password обязательны для заполнения'
+                })
+            }
+    elif method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': headers,
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    conn = get_connection()
     cur = conn.cursor()
     
     try:
@@ -65,33 +101,28 @@ def handler(event: dict, context) -> dict:
         
         # POST: сохранить новый auth_token
         if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            
-            username = body.get('username', '').strip()
-            password = body.get('password', '').strip()
-            
-            if not username or not password:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({
-                        'error': 'Username and password required',
-                        'message': 'Username и password обязательны для заполнения'
-                    })
-                }
-            
             # Храним в формате username:password
             credentials = f"{username}:{password}"
             
-            # Удаляем старые настройки
-            cur.execute(f"DELETE FROM {schema}.twitter_auth")
-            
-            # Добавляем новые
+            # Те же данные не перезаписываем: триггер поднял бы версию twitter_auth,
+            # и функция twitter сбросила бы живую сессию и логинилась заново
             cur.execute(f"""
-                INSERT INTO {schema}.twitter_auth 
-                (auth_token)
-                VALUES (%s)
-            """, (credentials,))
+                SELECT auth_token FROM {schema}.twitter_auth
+                ORDER BY created_at DESC
+                LIMIT 1
+            """)
+            current = cur.fetchone()
+            
+            if not current or current[0] != credentials:
+                # Удаляем старые настройки
+                cur.execute(f"DELETE FROM {schema}.twitter_auth")
+                
+                # Добавляем новые; триггер в той же транзакции поднимает версию twitter_auth в cache_versions
+                cur.execute(f"""
+                    INSERT INTO {schema}.twitter_auth 
+                    (auth_token)
+                    VALUES (%s)
+                """, (credentials,))
             
             conn.commit()
             
@@ -122,4 +153,4 @@ def handler(event: dict, context) -> dict:
         }
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
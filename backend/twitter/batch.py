@@ -0,0 +1,52 @@
+from db import get_connection, release_connection
+from dispatcher import claim_posts_by_id, post_results, store_results
+from publisher import publish_within_limits, tweet_url
+
+MAX_INTERVAL_SECONDS = 60
+
+
+def item_result(outcome) -> dict:
+    if isinstance(outcome, Exception):
+        return {'id': None, 'url': None, 'error': str(outcome)}
+    return {'id': str(outcome.id), 'url': tweet_url(outcome.id), 'error': None}
+
+
+def publish_text_batch(sessions, loop, schema: str, texts: list, account_id, concurrency: int, interval: float) -> list:
+    '''Публикует список текстов одним клиентом; ошибка одного твита не прерывает остальные'''
+    conn = get_connection()
+    try:
+        outcomes = publish_within_limits(
+            sessions, loop, conn, schema, [(account_id, text, None) for text in texts], concurrency, interval
+        )
+    finally:
+        release_connection(conn)
+    return [{'text': text, **item_result(outcome)} for text, outcome in zip(texts, outcomes)]
+
+
+def publish_post_batch(sessions, loop, schema: str, post_ids: list, concurrency: int, interval: float) -> list:
+    '''Публикует посты по id от имени их аккаунтов и записывает статусы так же, как диспетчер'''
+    conn = get_connection()
+    try:
+        posts = claim_posts_by_id(conn, schema, post_ids)
+        outcomes = []
+        if posts:
+            outcomes = publish_within_limits(
+                sessions, loop, conn, schema,
+                [(post['account_id'], post['content'], post['video_url']) for post in posts], concurrency, interval
+            )
+            store_results(conn, schema, post_results(posts, outcomes))
+    finally:
+        release_connection(conn)
+
+    by_id = {post['id']: (post, outcome) for post, outcome in zip(posts, outcomes)}
+    results = []
+    for post_id in post_ids:
+        if post_id not in by_id:
+            results.append({
+                'postId': post_id, 'text': None, 'id': None, 'url': None,
+                'error': 'Post not found, already published or being published'
+            })
+            continue
+        post, outcome = by_id[post_id]
+        results.append({'postId': post_id, 'text': post['content'], **item_result(outcome)})
+    return results
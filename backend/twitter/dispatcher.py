@@ -0,0 +1,148 @@
+import time
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+from db import get_connection, release_connection
+from session import CredentialsError, LoginError
+from publisher import publish_within_limits
+from ratelimit import is_rate_limited
+
+DEFAULT_BATCH_SIZE = 20
+MAX_BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 10
+# Сколько секунд один запуск диспетчера забирает новые пачки, чтобы уложиться в таймаут функции
+TIME_BUDGET_SECONDS = 20
+# Пост, зависший в publishing дольше этого срока, считаем потерянным после падения воркера
+STUCK_AFTER_MINUTES = 15
+
+
+def fail_stuck_posts(conn, schema: str) -> int:
+    '''Помечает failed посты, которые упавший воркер оставил в publishing; повторно их не публикуем, чтобы не задвоить твит'''
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE {schema}.posts
+        SET status = 'failed', updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'publishing'
+          AND updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 minute'
+    """, (STUCK_AFTER_MINUTES,))
+    count = cur.rowcount
+    conn.commit()
+    cur.close()
+    return count
+
+
+def claim_due_posts(conn, schema: str, batch_size: int) -> list:
+    '''Забирает пачку созревших постов; SKIP LOCKED не даёт двум диспетчерам взять один и тот же пост'''
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(f"""
+        UPDATE {schema}.posts
+        SET status = 'publishing', updated_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM {schema}.posts
+            WHERE status = 'pending'
+              AND scheduled_time <= CURRENT_TIMESTAMP
+            ORDER BY scheduled_time
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, account_id, content, video_url
+    """, (batch_size,))
+    posts = cur.fetchall()
+    conn.commit()
+    cur.close()
+    return posts
+
+
+def store_results(conn, schema: str, results: list) -> None:
+    '''Записывает статусы всей пачки одним UPDATE ... FROM (VALUES ...)'''
+    cur = conn.cursor()
+    # UPDATE ... FROM блокирует строки в порядке соединения; массовый POST лайков берёт те же посты
+    # по порядку id, поэтому сначала блокируем их в том же порядке, иначе возможна взаимная блокировка
+    cur.execute(f"""
+        SELECT id FROM {schema}.posts
+        WHERE id = ANY(%s)
+        ORDER BY id
+        FOR NO KEY UPDATE
+    """, ([r['id'] for r in results],))
+    execute_values(cur, f"""
+        UPDATE {schema}.posts AS p
+        SET status = v.status,
+            twitter_post_id = v.twitter_post_id,
+            published_at = CASE WHEN v.status = 'published' THEN CURRENT_TIMESTAMP END,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v (id, status, twitter_post_id)
+        WHERE p.id = v.id
+    """, [(r['id'], r['status'], r['twitter_post_id']) for r in results],
+        template='(%s::int, %s::text, %s::text)')
+    conn.commit()
+    cur.close()
+
+
+def claim_posts_by_id(conn, schema: str, post_ids: list) -> list:
+    '''Забирает указанные посты на публикацию; уже опубликованные и занятые другим воркером пропускаются'''
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(f"""
+        UPDATE {schema}.posts
+        SET status = 'publishing', updated_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM {schema}.posts
+            WHERE id = ANY(%s) AND status IN ('pending', 'failed')
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, account_id, content, video_url
+    """, (post_ids,))
+    posts = cur.fetchall()
+    conn.commit()
+    cur.close()
+    return posts
+
+
+def post_results(posts: list, outcomes: list) -> list:
+    '''Превращает результаты publish_texts в строки для store_results'''
+    results = []
+    for post, outcome in zip(posts, outcomes):
+        if isinstance(outcome, (LoginError, CredentialsError)) or is_rate_limited(outcome):
+            # Пост не виноват в неудачном логине или исчерпанном лимите: возвращаем его в очередь
+            results.append({'id': post['id'], 'status': 'pending', 'twitter_post_id': None, 'error': str(outcome)})
+        elif isinstance(outcome, Exception):
+            results.append({'id': post['id'], 'status': 'failed', 'twitter_post_id': None, 'error': str(outcome)})
+        else:
+            results.append({'id': post['id'], 'status': 'published', 'twitter_post_id': str(outcome.id), 'error': None})
+    return results
+
+
+def dispatch(sessions, loop, schema: str, batch_size: int, concurrency: int) -> dict:
+    '''Публикует созревшие посты пачками от имени их аккаунтов, пока они есть и не вышел бюджет времени'''
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    started = time.monotonic()
+    summary = {'published': 0, 'failed': 0, 'released': 0, 'stuck': 0, 'results': []}
+
+    conn = get_connection()
+    try:
+        summary['stuck'] = fail_stuck_posts(conn, schema)
+
+        while time.monotonic() - started < TIME_BUDGET_SECONDS:
+            posts = claim_due_posts(conn, schema, batch_size)
+            if not posts:
+                break
+
+            outcomes = publish_within_limits(
+                sessions, loop, conn, schema,
+                [(post['account_id'], post['content'], post['video_url']) for post in posts], concurrency
+            )
+            results = post_results(posts, outcomes)
+            store_results(conn, schema, results)
+
+            for result in results:
+                key = 'released' if result['status'] == 'pending' else result['status']
+                summary[key] += 1
+            summary['results'].extend(results)
+
+            if any(result['status'] == 'pending' for result in results):
+                break
+    finally:
+        release_connection(conn)
+
+    return summary
@@ -1,12 +1,110 @@
 import json
 import os
-import psycopg2
-from twikit import Client
-import asyncio
 
+from timing import traced
 
+# Модули с twikit, httpx и psycopg2 импортируются внутри handler уже после валидации:
+# OPTIONS и ошибки в запросе отвечают, не платя за их загрузку на холодном старте
+MAX_BATCH_ITEMS = 50
+# Числовые параметры тела: ошибка приведения должна стать 400, а не 500 внутри handler
+INT_FIELDS = ('concurrency', 'limit', 'batchSize')
+FLOAT_FIELDS = ('intervalSeconds',)
+
+# Один asyncio-цикл на контейнер: клиенты twikit и их keep-alive соединения к Twitter живут между тёплыми вызовами
+_loop = None
+
+
+def event_loop():
+    global _loop
+    if _loop is None:
+        import asyncio
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def validation_error(body: dict):
+    '''(error, message) для заведомо неверного POST-запроса; проверяется до базы и twikit'''
+    for fields, cast in ((INT_FIELDS, int), (FLOAT_FIELDS, float)):
+        for field in fields:
+            if field not in body:
+                continue
+            try:
+                cast(body[field])
+            except (TypeError, ValueError, OverflowError):
+                return f'Invalid {field}', f'{field} должен быть числом'
+    
+    action = body.get('action')
+    if action in ('dispatch', 'execute-likes', 'sync-metrics'):
+        return None
+    
+    if 'texts' in body or 'postIds' in body:
+        texts = body.get('texts') or []
+        post_ids = body.get('postIds') or []
+        # Строка вместо списка прошла бы как список символов: "123" опубликовал бы посты 1, 2 и 3
+        if not isinstance(texts, list) or not isinstance(post_ids, list):
+            return 'Invalid batch', 'texts и postIds должны быть списками'
+        items_count = len(texts) + len(post_ids)
+        if (items_count == 0 or items_count > MAX_BATCH_ITEMS
+                or not all(isinstance(text, str) and text.strip() for text in texts)):
+            return 'Invalid batch', f'Передайте от 1 до {MAX_BATCH_ITEMS} непустых текстов или id постов'
+        if not all(
+            (isinstance(post_id, int) and not isinstance(post_id, bool) and post_id > 0)
+            or (isinstance(post_id, str) and post_id.isdigit())
+            for post_id in post_ids
+        ):
+            return 'Invalid batch', 'Id постов должны быть числами'
+        return None
+    
+    if action == 'like':
+        if not body.get('tweetId'):
+            return 'tweetId is required', 'Укажите id твита для лайка'
+        return None
+    
+    if not body.get('text'):
+        return 'Text is required', 'Текст поста не может быть пустым'
+    return None
+
+
+def resolve_session(sessions, account_id, headers: dict) -> tuple:
+    '''Сессия аккаунта (или основная) и готовый ответ с ошибкой, если её не получить'''
+    from session import CredentialsError
+    from pool import AccountUnavailable
+    
+    try:
+        return sessions.resolve(account_id), None
+    except CredentialsError as e:
+        return None, {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({
+                'error': e.error,
+                'message': e.message
+            })
+        }
+    except AccountUnavailable as e:
+        return None, {
+            'statusCode': 404,
+            'headers': headers,
+            'body': json.dumps({
+                'error': 'Account not found',
+                'message': str(e)
+            })
+        }
+    except Exception as e:
+        return None, {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({
+                'error': 'Failed to load credentials',
+                'message': f'Не удалось загрузить токен из базы: {str(e)}'
+            })
+        }
+
+
+@traced('twitter')
 def handler(event: dict, context) -> dict:
-    '''API для работы с Twitter через логин/пароль: проверка подключения и публикация постов'''
+    '''API для работы с Twitter через логин/пароль: проверка подключения, публикация и лайки от имени любого аккаунта'''
     
     method = event.get('httpMethod', 'GET')
     
@@ -33,77 +131,127 @@ def handler(event: dict, context) -> dict:
             })
         }
     
-    try:
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor()
-        
-        cur.execute(f"""
-            SELECT auth_token
-            FROM {schema}.twitter_auth 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if not row or not row[0]:
+    body = {}
+    if method == 'POST':
+        try:
+            body = json.loads(event.get('body') or '{}')
+            if not isinstance(body, dict):
+                raise ValueError('body is not an object')
+        except ValueError:
             return {
                 'statusCode': 400,
                 'headers': headers,
                 'body': json.dumps({
-                    'error': 'Twitter credentials not configured',
-                    'message': 'Пожалуйста, добавьте данные для входа в настройках'
+                    'error': 'Invalid JSON',
+                    'message': 'Тело запроса должно быть JSON-объектом'
                 })
             }
-        
-        # auth_token на самом деле хранит username:password
-        credentials = row[0].split(':', 1)
-        if len(credentials) != 2:
+    
+    query_params = event.get('queryStringParameters') or {}
+    account_id = body.get('accountId') or query_params.get('accountId')
+    if account_id and not str(account_id).isdigit():
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({
+                'error': 'Invalid accountId',
+                'message': 'accountId должен быть числом'
+            })
+        }
+    account_id = int(account_id) if account_id else None
+    
+    if method == 'POST':
+        error = validation_error(body)
+        if error:
             return {
                 'statusCode': 400,
                 'headers': headers,
                 'body': json.dumps({
-                    'error': 'Invalid credentials format',
-                    'message': 'Неверный формат данных. Используйте username:password'
+                    'error': error[0],
+                    'message': error[1]
                 })
             }
+    elif method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': headers,
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    from twikit.errors import TooManyRequests
+    from session import LoginError
+    from pool import Sessions
+    from ratelimit import RateLimited, take_one, note_rate_limit
+    
+    loop = event_loop()
+    sessions = Sessions(schema)
+    
+    # Исполнитель отложенных лайков работает от имени аккаунтов из accounts, основной логин ему не нужен
+    if body.get('action') == 'execute-likes':
+        import like_executor
         
-        username, password = credentials
-        
-    except Exception as e:
+        try:
+            summary = like_executor.execute_likes(
+                sessions, loop, schema, int(body.get('concurrency', like_executor.DEFAULT_CONCURRENCY))
+            )
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Failed to execute likes',
+                    'message': f'Ошибка при выполнении лайков: {str(e)}'
+                })
+            }
         return {
-            'statusCode': 500,
+            'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({
-                'error': 'Failed to load credentials',
-                'message': f'Не удалось загрузить токен из базы: {str(e)}'
-            })
+            'body': json.dumps({'success': True, **summary})
         }
     
-    # Initialize and login to Twitter
-    try:
-        client = Client('en-US')
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(client.login(
-            auth_info_1=username,
-            password=password
-        ))
+    # Метрики опубликованных твитов пачками от основного аккаунта, вызывается по таймеру
+    if body.get('action') == 'sync-metrics':
+        import metrics_sync
         
-    except Exception as e:
+        try:
+            summary = metrics_sync.sync_metrics(
+                sessions, loop, schema,
+                int(body.get('limit', metrics_sync.DEFAULT_LIMIT)),
+                int(body.get('concurrency', metrics_sync.DEFAULT_CONCURRENCY))
+            )
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Failed to sync metrics',
+                    'message': f'Ошибка при обновлении метрик: {str(e)}'
+                })
+            }
         return {
-            'statusCode': 401,
+            'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({
-                'error': 'Login failed',
-                'message': f'Не удалось войти в Twitter: {str(e)}'
-            })
+            'body': json.dumps({'success': True, **summary})
         }
     
-    # GET: Check connection (login already done above)
+    # GET: Check connection
     if method == 'GET':
+        session, error = resolve_session(sessions, account_id, headers)
+        if error:
+            return error
+        
+        try:
+            loop.run_until_complete(session.verify())
+        except Exception as e:
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Login failed',
+                    'message': f'Не удалось войти в Twitter: {str(e)}'
+                })
+            }
+        
         return {
             'statusCode': 200,
             'headers': headers,
@@ -111,7 +259,7 @@ def handler(event: dict, context) -> dict:
                 'success': True,
                 'message': 'Вход в Twitter выполнен успешно!',
                 'user': {
-                    'username': username
+                    'username': session.username
                 }
             })
         }
@@ -119,22 +267,86 @@ def handler(event: dict, context) -> dict:
     # POST: Create tweet
     if method == 'POST':
         try:
-            body = json.loads(event.get('body', '{}'))
-            text = body.get('text', '')
+            # Диспетчер: публикует все созревшие pending-посты, вызывается по таймеру
+            if body.get('action') == 'dispatch':
+                from dispatcher import dispatch, DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY
+                
+                summary = dispatch(
+                    sessions, loop, schema,
+                    int(body.get('batchSize', DEFAULT_BATCH_SIZE)),
+                    int(body.get('concurrency', DEFAULT_CONCURRENCY))
+                )
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'success': True, **summary})
+                }
             
-            if not text:
+            # Пакетная публикация: список текстов или id постов через один залогиненный клиент
+            if 'texts' in body or 'postIds' in body:
+                from dispatcher import DEFAULT_CONCURRENCY, MAX_CONCURRENCY
+                from batch import publish_text_batch, publish_post_batch, MAX_INTERVAL_SECONDS
+                
+                texts = body.get('texts') or []
+                post_ids = [int(post_id) for post_id in body.get('postIds') or []]
+                concurrency = max(1, min(int(body.get('concurrency', DEFAULT_CONCURRENCY)), MAX_CONCURRENCY))
+                interval = max(0.0, min(float(body.get('intervalSeconds', 0)), MAX_INTERVAL_SECONDS))
+                
+                results = []
+                if texts:
+                    results += publish_text_batch(sessions, loop, schema, texts, account_id, concurrency, interval)
+                if post_ids:
+                    results += publish_post_batch(sessions, loop, schema, post_ids, concurrency, interval)
+                
+                published = sum(1 for result in results if result['id'])
                 return {
-                    'statusCode': 400,
+                    'statusCode': 200,
                     'headers': headers,
                     'body': json.dumps({
-                        'error': 'Text is required',
-                        'message': 'Текст поста не может быть пустым'
+                        'success': published > 0,
+                        'published': published,
+                        'failed': len(results) - published,
+                        'results': results
                     })
                 }
             
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            tweet = loop.run_until_complete(client.create_tweet(text))
+            # Лайк твита от имени аккаунта
+            if body.get('action') == 'like':
+                tweet_id = str(body['tweetId'])
+                session, error = resolve_session(sessions, account_id, headers)
+                if error:
+                    return error
+                
+                take_one(schema, 'like', account_id)
+                try:
+                    loop.run_until_complete(session.call(lambda client: client.favorite_tweet(tweet_id)))
+                except TooManyRequests as e:
+                    note_rate_limit(schema, 'like', account_id, e)
+                    raise
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({
+                        'success': True,
+                        'message': 'Лайк поставлен!',
+                        'like': {'tweetId': tweet_id, 'accountId': account_id}
+                    })
+                }
+            
+            from publisher import create_tweet, tweet_url
+            
+            text = body['text']
+            video_url = body.get('videoUrl')
+            session, error = resolve_session(sessions, account_id, headers)
+            if error:
+                return error
+            
+            take_one(schema, 'tweet', account_id)
+            try:
+                tweet = loop.run_until_complete(session.call(lambda client: create_tweet(client, text, video_url)))
+            except TooManyRequests as e:
+                note_rate_limit(schema, 'tweet', account_id, e)
+                raise
             
             return {
                 'statusCode': 200,
@@ -145,11 +357,29 @@ def handler(event: dict, context) -> dict:
                     'tweet': {
                         'id': str(tweet.id) if hasattr(tweet, 'id') else 'unknown',
                         'text': text,
-                        'url': f'https://twitter.com/i/web/status/{tweet.id}' if hasattr(tweet, 'id') else None
+                        'url': tweet_url(tweet.id) if hasattr(tweet, 'id') else None
                     }
                 })
             }
             
+        except (RateLimited, TooManyRequests) as e:
+            return {
+                'statusCode': 429,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Rate limited',
+                    'message': f'Лимит Twitter для аккаунта исчерпан: {str(e)}'
+                })
+            }
+        except LoginError as e:
+            return {
+                'statusCode': 401,
+                'headers': headers,
+                'body': json.dumps({
+                    'error': 'Login failed',
+                    'message': f'Не удалось войти в Twitter: {str(e)}'
+                })
+            }
         except Exception as e:
             return {
                 'statusCode': 500,
@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import time
+
+from psycopg2.extras import RealDictCursor, execute_values
+from twikit.errors import TooManyRequests
+
+from db import get_connection, release_connection
+from pool import MAX_CLIENTS
+from ratelimit import grant, record_rate_limits
+
+# Сколько лайков один запуск держит в памяти; остальная очередь ждёт в базе
+WINDOW_SIZE = 2000
+# Забираем только лайки, которые наступят в пределах бюджета времени одного запуска
+TIME_BUDGET_SECONDS = 20
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 20
+FLUSH_EVERY = 50
+# Лайк в running дольше этого срока остался от упавшего воркера: возвращаем в очередь, повтор лайка безопасен
+STUCK_AFTER_MINUTES = 10
+# Лайк, опоздавший больше чем на сутки, уже не ставим
+MAX_LATENESS_HOURS = 24
+
+
+def requeue_stuck_likes(conn, schema: str) -> int:
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE {schema}.likes
+        SET status = 'pending', claimed_at = NULL
+        WHERE status = 'running'
+          AND claimed_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 minute'
+    """, (STUCK_AFTER_MINUTES,))
+    count = cur.rowcount
+    conn.commit()
+    cur.close()
+    return count
+
+
+def expire_stale_likes(conn, schema: str) -> int:
+    '''Снимает с очереди лайки к неопубликованным постам и сильно опоздавшие лайки'''
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE {schema}.likes AS l
+        SET status = CASE WHEN p.status = 'failed' THEN 'skipped' ELSE 'expired' END
+        FROM {schema}.posts p
+        WHERE l.post_id = p.id
+          AND l.status = 'pending'
+          AND (
+              p.status = 'failed'
+              -- Опоздание считаем только от опубликованного поста: лайки к посту на послезавтра ждут публикации
+              OR p.published_at IS NOT NULL AND GREATEST(l.liked_at, p.published_at) + l.delay_minutes * INTERVAL '1 minute'
+                 < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+          )
+    """, (MAX_LATENESS_HOURS,))
+    count = cur.rowcount
+    conn.commit()
+    cur.close()
+    return count
+
+
+def claim_due_likes(conn, schema: str, limit: int) -> list:
+    '''Забирает лайки, срок которых наступит в пределах запуска; лайк не раньше публикации поста'''
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(f"""
+        WITH due AS (
+            SELECT
+                l.id,
+                l.liked_at,
+                p.twitter_post_id,
+                GREATEST(l.liked_at, p.published_at) + l.delay_minutes * INTERVAL '1 minute' AS due_at
+            FROM {schema}.likes l
+            JOIN {schema}.posts p ON p.id = l.post_id
+            JOIN {schema}.accounts a ON a.id = l.account_id
+            WHERE l.status = 'pending'
+              AND p.twitter_post_id IS NOT NULL
+              AND a.is_active = true
+              AND GREATEST(l.liked_at, p.published_at) + l.delay_minutes * INTERVAL '1 minute'
+                  <= CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            ORDER BY due_at
+            LIMIT %s
+            FOR UPDATE OF l SKIP LOCKED
+        )
+        UPDATE {schema}.likes AS l
+        SET status = 'running', claimed_at = CURRENT_TIMESTAMP
+        FROM due
+        WHERE l.id = due.id AND l.liked_at = due.liked_at
+        RETURNING
+            l.id, l.liked_at, l.account_id, due.twitter_post_id,
+            EXTRACT(EPOCH FROM due.due_at - CURRENT_TIMESTAMP)::float AS wait_seconds
+    """, (TIME_BUDGET_SECONDS, limit))
+    likes = cur.fetchall()
+    conn.commit()
+    cur.close()
+    return likes
+
+
+def store_like_results(conn, schema: str, results: list) -> None:
+    '''Записывает статусы пачки лайков одним UPDATE ... FROM (VALUES ...); liked_at в ключе выбирает
+    секцию likes, иначе поиск по id прошёл бы по индексам всех месяцев'''
+    cur = conn.cursor()
+    execute_values(cur, f"""
+        UPDATE {schema}.likes AS l
+        SET status = v.status,
+            error = v.error,
+            executed_at = CASE WHEN v.status = 'done' THEN CURRENT_TIMESTAMP END
+        FROM (VALUES %s) AS v (id, liked_at, status, error)
+        WHERE l.id = v.id AND l.liked_at = v.liked_at
+    """, results, template='(%s::int, %s::timestamp, %s::text, %s::text)')
+    conn.commit()
+    cur.close()
+
+
+def is_already_liked(error: Exception) -> bool:
+    # Код 139: твит уже лайкнут этим аккаунтом — повторный запуск после сбоя ничего не ломает
+    message = str(error).lower()
+    return '139' in message or 'already favorited' in message
+
+
+def account_chunks(likes: list, max_accounts: int) -> list:
+    '''Делит окно по сроку на части не больше чем с max_accounts разными аккаунтами:
+    сессии одной части умещаются в пул клиентов'''
+    chunks = []
+    accounts = set()
+    for like in sorted(likes, key=lambda like: like['wait_seconds']):
+        if not chunks or (like['account_id'] not in accounts and len(accounts) >= max_accounts):
+            chunks.append([])
+            accounts = set()
+        chunks[-1].append(like)
+        accounts.add(like['account_id'])
+    return chunks
+
+
+async def fire_likes(likes: list, sessions, concurrency: int, flush, rate_limited: list, started: float = None) -> dict:
+    '''Ставит лайки в порядке наступления срока из кучи; статусы сбрасываются в базу пачками.
+    Ответы 429 возвращают лайк в очередь и складываются в rate_limited.
+    started — момент loop.time(), от которого отсчитаны wait_seconds (по умолчанию — сейчас)'''
+    loop = asyncio.get_running_loop()
+    if started is None:
+        started = loop.time()
+    queue = [(started + max(0.0, like['wait_seconds']), like['id'], like) for like in likes]
+    heapq.heapify(queue)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    pending_results = []
+    summary = {'done': 0, 'failed': 0, 'deferred': 0}
+    tasks = set()
+
+    def record(like: dict, status: str, error) -> None:
+        summary['deferred' if status == 'pending' else status] += 1
+        pending_results.append((like['id'], like['liked_at'], status, error))
+        if len(pending_results) >= FLUSH_EVERY:
+            flush(pending_results[:])
+            pending_results.clear()
+
+    async def fire(like: dict) -> None:
+        try:
+            session = sessions.get(like['account_id'])
+            await session.call(lambda client: client.favorite_tweet(like['twitter_post_id']))
+            record(like, 'done', None)
+        except TooManyRequests as e:
+            rate_limited.append((like['account_id'], e))
+            record(like, 'pending', str(e)[:500])
+        except Exception as e:
+            if is_already_liked(e):
+                record(like, 'done', None)
+            else:
+                record(like, 'failed', str(e)[:500])
+        finally:
+            semaphore.release()
+
+    while queue:
+        fire_at, _, like = heapq.heappop(queue)
+        delay = fire_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await semaphore.acquire()
+        task = asyncio.create_task(fire(like))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    if pending_results:
+        flush(pending_results[:])
+
+    return summary
+
+
+def execute_likes(sessions, loop, schema: str, concurrency: int) -> dict:
+    '''Один запуск исполнителя: чистит очередь, забирает окно созревших лайков и ставит их'''
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    summary = {'done': 0, 'failed': 0, 'requeued': 0, 'expired': 0}
+
+    conn = get_connection()
+    try:
+        summary['requeued'] = requeue_stuck_likes(conn, schema)
+        summary['expired'] = expire_stale_likes(conn, schema)
+
+        likes = claim_due_likes(conn, schema, WINDOW_SIZE)
+        if not likes:
+            return summary
+        # wait_seconds отсчитаны от момента захвата окна; части окна ставятся по тем же срокам
+        claimed = loop.time()
+
+        # Лайки аккаунтов без бюджета сразу возвращаем в очередь, не тратя запросы на 429
+        allowed = grant(conn, schema, 'like', [like['account_id'] for like in likes])
+        deferred = [(like['id'], like['liked_at'], 'pending', 'Лимит лайков аккаунта исчерпан') for like, ok in zip(likes, allowed) if not ok]
+        if deferred:
+            store_like_results(conn, schema, deferred)
+        likes = [like for like, ok in zip(likes, allowed) if ok]
+
+        started = time.monotonic()
+        rate_limited = []
+        summary['deferred'] = len(deferred)
+        for chunk in account_chunks(likes, MAX_CLIENTS):
+            sessions.prepare(conn, [like['account_id'] for like in chunk])
+            fired = loop.run_until_complete(fire_likes(
+                chunk, sessions, concurrency, lambda results: store_like_results(conn, schema, results),
+                rate_limited, claimed
+            ))
+            for key, value in fired.items():
+                summary[key] += value
+        record_rate_limits(conn, schema, 'like', rate_limited)
+        summary['seconds'] = round(time.monotonic() - started, 2)
+    finally:
+        release_connection(conn)
+
+    return summary
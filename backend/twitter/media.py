@@ -0,0 +1,111 @@
+import asyncio
+import io
+import mimetypes
+
+import httpx
+from twikit.errors import Unauthorized
+
+# Размер сегмента APPEND; в памяти одновременно не больше (PARALLEL_APPENDS + 1) сегментов
+SEGMENT_SIZE = 4 * 1024 * 1024
+PARALLEL_APPENDS = 3
+SEGMENT_RETRIES = 3
+PROCESSING_TIMEOUT_SECONDS = 120
+
+# Видео скачиваем отдельным клиентом: cookies Twitter не должны уходить на чужой хост
+_download_client = None
+
+
+class MediaUploadError(Exception):
+    '''Twitter не принял или не обработал видео'''
+
+
+def download_client() -> httpx.AsyncClient:
+    global _download_client
+    if _download_client is None:
+        _download_client = httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(30.0, read=60.0))
+    return _download_client
+
+
+def video_media_type(response: httpx.Response, video_url: str) -> str:
+    content_type = response.headers.get('content-type', '').split(';')[0].strip()
+    if content_type.startswith('video/'):
+        return content_type
+    return mimetypes.guess_type(video_url)[0] or 'video/mp4'
+
+
+async def read_segments(response: httpx.Response):
+    '''Отдаёт тело ответа сегментами ровно по SEGMENT_SIZE (последний — короче)'''
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes(SEGMENT_SIZE):
+        buffer.extend(chunk)
+        while len(buffer) >= SEGMENT_SIZE:
+            yield bytes(buffer[:SEGMENT_SIZE])
+            del buffer[:SEGMENT_SIZE]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def append_segment(client, media_id: str, segment_index: int, segment: bytes) -> None:
+    '''APPEND одного сегмента; при сбое повторяется только этот сегмент, а не вся загрузка'''
+    for attempt in range(SEGMENT_RETRIES):
+        try:
+            await client.v11.upload_media_append(False, media_id, segment_index, io.BytesIO(segment))
+            return
+        except Unauthorized:
+            raise
+        except Exception:
+            if attempt == SEGMENT_RETRIES - 1:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+
+async def wait_for_processing(client, media_id: str, processing_info) -> None:
+    '''Ждёт, пока Twitter перекодирует видео, иначе create_tweet его не примет'''
+    waited = 0
+    while processing_info and processing_info.get('state') in ('pending', 'in_progress'):
+        delay = processing_info.get('check_after_secs', 2)
+        waited += delay
+        if waited > PROCESSING_TIMEOUT_SECONDS:
+            raise MediaUploadError('Twitter слишком долго обрабатывает видео')
+        await asyncio.sleep(delay)
+        status, _ = await client.v11.upload_media_status(False, media_id)
+        processing_info = status.get('processing_info')
+
+    if processing_info and processing_info.get('state') == 'failed':
+        raise MediaUploadError(processing_info.get('error', {}).get('message', 'Twitter не смог обработать видео'))
+
+
+async def upload_video(client, video_url: str) -> str:
+    '''Потоково перекачивает видео по ссылке в chunked upload Twitter (INIT/APPEND/FINALIZE), не держа файл в памяти'''
+    async with download_client().stream('GET', video_url) as response:
+        response.raise_for_status()
+        total_bytes = int(response.headers.get('content-length') or 0)
+        if not total_bytes:
+            raise MediaUploadError('Источник видео не сообщил размер файла')
+
+        init, _ = await client.v11.upload_media_init(
+            video_media_type(response, video_url), total_bytes, 'tweet_video', False
+        )
+        media_id = init['media_id_string'] if 'media_id_string' in init else str(init['media_id'])
+
+        in_flight = set()
+        segment_index = 0
+        try:
+            async for segment in read_segments(response):
+                if len(in_flight) >= PARALLEL_APPENDS:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                in_flight.add(asyncio.create_task(append_segment(client, media_id, segment_index, segment)))
+                segment_index += 1
+
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        except BaseException:
+            for task in in_flight:
+                task.cancel()
+            raise
+
+    finalize, _ = await client.v11.upload_media_finelize(False, media_id)
+    await wait_for_processing(client, media_id, finalize.get('processing_info'))
+    return media_id
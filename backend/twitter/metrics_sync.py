@@ -0,0 +1,150 @@
+import asyncio
+
+from psycopg2.extras import RealDictCursor, execute_values
+from twikit.errors import TooManyRequests
+
+from db import get_connection, release_connection
+from ratelimit import grant, record_rate_limits
+
+# Сколько id твитов уходит в один запрос get_tweets_by_ids
+LOOKUP_BATCH_SIZE = 100
+DEFAULT_LIMIT = 2000
+MAX_LIMIT = 10000
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 10
+
+
+def stale_posts(conn, schema: str, limit: int) -> list:
+    '''Опубликованные посты, метрики которых пора обновить, от свежих к старым.
+    Свежие твиты набирают реакции быстро, поэтому обновляются чаще; бюджет запуска уходит на них первыми'''
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(f"""
+        SELECT p.id, p.twitter_post_id
+        FROM {schema}.posts p
+        LEFT JOIN {schema}.post_metrics m ON m.post_id = p.id
+        WHERE p.status = 'published'
+          AND p.twitter_post_id IS NOT NULL
+          AND (
+              m.post_id IS NULL
+              OR (
+                  NOT m.unavailable
+                  AND m.synced_at < CURRENT_TIMESTAMP - CASE
+                      WHEN p.published_at > CURRENT_TIMESTAMP - INTERVAL '1 day' THEN INTERVAL '15 minutes'
+                      WHEN p.published_at > CURRENT_TIMESTAMP - INTERVAL '7 days' THEN INTERVAL '2 hours'
+                      WHEN p.published_at > CURRENT_TIMESTAMP - INTERVAL '30 days' THEN INTERVAL '1 day'
+                      ELSE INTERVAL '7 days'
+                  END
+              )
+          )
+        ORDER BY p.published_at DESC NULLS LAST, p.id DESC
+        LIMIT %s
+    """, (limit,))
+    posts = cur.fetchall()
+    cur.close()
+    return posts
+
+
+def tweet_metrics(tweet) -> tuple:
+    '''(лайки, ретвиты, ответы, цитаты, просмотры); просмотры twikit отдаёт строкой или не отдаёт вовсе'''
+    views = getattr(tweet, 'view_count', None)
+    return (
+        tweet.favorite_count, tweet.retweet_count, tweet.reply_count,
+        getattr(tweet, 'quote_count', None), int(views) if views else None
+    )
+
+
+async def fetch_metrics(session, batches: list, concurrency: int, rate_limited: list, errors: list) -> dict:
+    '''Метрики по id твитов: пачки параллельно через одну сессию; после первого 429 новые пачки не запрашиваются.
+    Неудачная пачка пропускается и попадёт в следующий запуск'''
+    semaphore = asyncio.Semaphore(concurrency)
+    metrics = {}
+
+    async def lookup(ids: list) -> None:
+        async with semaphore:
+            if rate_limited:
+                return
+            try:
+                tweets = await session.call(lambda client: client.get_tweets_by_ids(ids))
+            except TooManyRequests as e:
+                rate_limited.append((None, e))
+                return
+            except Exception as e:
+                errors.append(str(e)[:500])
+                return
+        if len(tweets) == len(ids):
+            # Ответ идёт в порядке запроса; удалённый или скрытый твит приходит как None
+            for tweet_id, tweet in zip(ids, tweets):
+                metrics[tweet_id] = tweet_metrics(tweet) if tweet is not None else None
+        else:
+            # Без выравнивания по порядку отсутствующий твит нельзя считать удалённым: просто пропускаем
+            for tweet in tweets:
+                if tweet is not None:
+                    metrics[str(tweet.id)] = tweet_metrics(tweet)
+
+    await asyncio.gather(*(lookup(ids) for ids in batches))
+    return metrics
+
+
+def store_metrics(conn, schema: str, rows: list) -> None:
+    '''Все метрики запуска одним INSERT ... ON CONFLICT'''
+    cur = conn.cursor()
+    execute_values(cur, f"""
+        INSERT INTO {schema}.post_metrics
+            (post_id, like_count, retweet_count, reply_count, quote_count, view_count, unavailable, synced_at)
+        VALUES %s
+        ON CONFLICT (post_id) DO UPDATE
+        SET like_count = COALESCE(EXCLUDED.like_count, post_metrics.like_count),
+            retweet_count = COALESCE(EXCLUDED.retweet_count, post_metrics.retweet_count),
+            reply_count = COALESCE(EXCLUDED.reply_count, post_metrics.reply_count),
+            quote_count = COALESCE(EXCLUDED.quote_count, post_metrics.quote_count),
+            view_count = COALESCE(EXCLUDED.view_count, post_metrics.view_count),
+            unavailable = EXCLUDED.unavailable,
+            synced_at = EXCLUDED.synced_at
+    """, rows, template='(%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)', page_size=1000)
+    conn.commit()
+    cur.close()
+
+
+def sync_metrics(sessions, loop, schema: str, limit: int, concurrency: int) -> dict:
+    '''Один запуск: берёт до limit устаревших постов, запрашивает метрики пачками от основного аккаунта
+    в пределах его бюджета lookup и сохраняет их'''
+    limit = max(1, min(limit, MAX_LIMIT))
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    summary = {'synced': 0, 'unavailable': 0, 'skipped': 0, 'errors': []}
+
+    conn = get_connection()
+    try:
+        posts = stale_posts(conn, schema, limit)
+        if not posts:
+            return summary
+
+        tweet_ids = [post['twitter_post_id'] for post in posts]
+        batches = [tweet_ids[i:i + LOOKUP_BATCH_SIZE] for i in range(0, len(tweet_ids), LOOKUP_BATCH_SIZE)]
+        # Пачки сверх бюджета остаются на следующий запуск; посты отсортированы, поэтому отпадают самые старые
+        batches = [ids for ids, ok in zip(batches, grant(conn, schema, 'lookup', [None] * len(batches))) if ok]
+
+        rate_limited = []
+        metrics = loop.run_until_complete(fetch_metrics(
+            sessions.main(), batches, concurrency, rate_limited, summary['errors']
+        ))
+        record_rate_limits(conn, schema, 'lookup', rate_limited[:1])
+
+        rows = []
+        for post in posts:
+            if post['twitter_post_id'] not in metrics:
+                continue
+            values = metrics[post['twitter_post_id']]
+            if values is None:
+                rows.append((post['id'], None, None, None, None, None, True))
+            else:
+                rows.append((post['id'], *values, False))
+        if rows:
+            store_metrics(conn, schema, rows)
+
+        summary['unavailable'] = sum(1 for row in rows if row[-1])
+        summary['synced'] = len(rows) - summary['unavailable']
+        summary['skipped'] = len(posts) - len(rows)
+    finally:
+        release_connection(conn)
+
+    return summary
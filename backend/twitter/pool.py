@@ -0,0 +1,146 @@
+import time
+from collections import OrderedDict
+
+from db import get_connection, release_connection
+from session import account_session, credentials_version, load_accounts, load_credentials, main_session
+
+# Сколько залогиненных клиентов держит один тёплый контейнер
+MAX_CLIENTS = 100
+# Клиент, которым не пользовались дольше этого срока, выбрасывается из пула
+IDLE_TTL_SECONDS = 15 * 60
+
+
+class AccountUnavailable(Exception):
+    '''Аккаунт не найден или выключен'''
+
+
+class ClientPool:
+    '''LRU-пул сессий аккаунтов по id; живёт на уровне модуля и переживает тёплые вызовы функции'''
+
+    def __init__(self, max_size: int, idle_ttl: float):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        # account_id -> [session, auth_token, last_used]
+        self._entries = OrderedDict()
+        self._version = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, account_id: int) -> None:
+        session = self._entries.pop(account_id)[0]
+        session.close()
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for account_id in [key for key, entry in self._entries.items() if now - entry[2] > self.idle_ttl]:
+            self._discard(account_id)
+
+    def _sync_version(self, conn, schema: str) -> None:
+        '''После изменения accounts выбрасывает клиентов выключенных аккаунтов и аккаунтов с новым токеном'''
+        cur = conn.cursor()
+        cur.execute(f"SELECT version FROM {schema}.cache_versions WHERE name = 'accounts'")
+        row = cur.fetchone()
+        version = row[0] if row else 0
+
+        if version != self._version and self._entries:
+            cur.execute(f"""
+                SELECT id, auth_token FROM {schema}.accounts
+                WHERE id = ANY(%s) AND is_active = true
+            """, (list(self._entries),))
+            tokens = dict(cur.fetchall())
+            for account_id in list(self._entries):
+                if tokens.get(account_id) != self._entries[account_id][1]:
+                    self._discard(account_id)
+
+        self._version = version
+        cur.close()
+
+    def sessions(self, conn, schema: str, account_ids: list) -> dict:
+        '''Сессии нужных аккаунтов: из пула, а недостающие — по данным из accounts одним запросом'''
+        self._evict_idle()
+        self._sync_version(conn, schema)
+
+        now = time.monotonic()
+        missing = [account_id for account_id in account_ids if account_id not in self._entries]
+        if missing:
+            for account_id, account in load_accounts(conn, schema, missing).items():
+                self._entries[account_id] = [account_session(schema, account), account['auth_token'], now]
+
+        result = {}
+        for account_id in account_ids:
+            entry = self._entries.get(account_id)
+            if entry:
+                entry[2] = now
+                self._entries.move_to_end(account_id)
+                result[account_id] = entry[0]
+
+        # Сессии, которые сейчас отдаём, не закрываем: при запросе больше max_size аккаунтов пул временно растёт
+        # и ужимается на следующем вызове
+        excess = len(self._entries) - self.max_size
+        if excess > 0:
+            for account_id in [key for key in self._entries if key not in result][:excess]:
+                self._discard(account_id)
+
+        return result
+
+
+POOL = ClientPool(MAX_CLIENTS, IDLE_TTL_SECONDS)
+
+# Основная сессия из twitter_auth переживает тёплые вызовы, пока не поднялась версия twitter_auth:
+# на каждый запрос — только чтение версии по первичному ключу, без запроса к twitter_auth
+_main = {'version': None, 'session': None}
+
+
+class Sessions:
+    '''Сессии одного вызова: основной аккаунт из twitter_auth (загружается лениво) и аккаунты из пула'''
+
+    def __init__(self, schema: str):
+        self.schema = schema
+        self._main = None
+        self._accounts = {}
+
+    def main(self):
+        if self._main is None:
+            # Версию читаем до данных: если они поменяются между запросами, следующий вызов увидит новую версию
+            version = credentials_version(self.schema)
+            if _main['version'] != version or _main['session'] is None:
+                if _main['session'] is not None:
+                    _main['session'].close()
+                    _main['session'] = None
+                auth = load_credentials(self.schema)
+                _main['session'] = main_session(self.schema, auth)
+                _main['version'] = version
+            self._main = _main['session']
+        return self._main
+
+    def prepare(self, conn, account_ids: list) -> None:
+        '''Подтягивает сессии аккаунтов заранее, чтобы внутри asyncio не ходить в базу.
+        Сессии прошлых вызовов prepare заменяются: пул мог уже вытеснить и закрыть их'''
+        wanted = [account_id for account_id in set(account_ids) if account_id]
+        if not wanted:
+            self._accounts = {}
+            return
+        if conn is not None:
+            self._accounts = POOL.sessions(conn, self.schema, wanted)
+            return
+
+        conn = get_connection()
+        try:
+            self._accounts = POOL.sessions(conn, self.schema, wanted)
+        finally:
+            release_connection(conn)
+
+    def resolve(self, account_id=None):
+        '''Сессия для одиночного запроса: при необходимости сам открывает соединение с базой'''
+        if account_id:
+            self.prepare(None, [account_id])
+        return self.get(account_id)
+
+    def get(self, account_id=None):
+        '''Сессия аккаунта или основная сессия, если аккаунт не указан'''
+        if not account_id:
+            return self.main()
+        if account_id not in self._accounts:
+            raise AccountUnavailable(f'Аккаунт {account_id} не найден или выключен')
+        return self._accounts[account_id]
@@ -0,0 +1,72 @@
+import asyncio
+
+from twikit.errors import TooManyRequests
+
+from media import upload_video
+from ratelimit import RateLimited, grant, record_rate_limits
+
+
+def tweet_url(tweet_id: str) -> str:
+    return f'https://twitter.com/i/web/status/{tweet_id}'
+
+
+async def create_tweet(client, text: str, video_url=None):
+    '''Твит с текстом и, если есть ссылка, с видео, перекачанным потоково'''
+    if not video_url:
+        return await client.create_tweet(text)
+    media_id = await upload_video(client, video_url)
+    return await client.create_tweet(text, media_ids=[media_id])
+
+
+class Pacer:
+    '''Разносит старты запросов так, чтобы между ними было не меньше interval секунд'''
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_at = 0.0
+
+    async def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_at)
+        self.next_at = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def publish_texts(sessions, items: list, concurrency: int, interval: float = 0.0) -> list:
+    '''Публикует тройки (account_id, текст, ссылка на видео или None); для каждой возвращает твит или исключение'''
+    semaphore = asyncio.Semaphore(concurrency)
+    pacer = Pacer(interval)
+
+    async def publish(account_id, text: str, video_url):
+        async with semaphore:
+            session = sessions.get(account_id)
+            await pacer.wait()
+            return await session.call(lambda client: create_tweet(client, text, video_url))
+
+    return await asyncio.gather(
+        *(publish(account_id, text, video_url) for account_id, text, video_url in items),
+        return_exceptions=True
+    )
+
+
+def publish_within_limits(sessions, loop, conn, schema: str, items: list, concurrency: int, interval: float = 0.0) -> list:
+    '''Публикует только то, на что у аккаунтов хватает бюджета; остальное получает RateLimited без запроса к Twitter'''
+    allowed = grant(conn, schema, 'tweet', [account_id for account_id, _, _ in items])
+    ready = [item for item, ok in zip(items, allowed) if ok]
+
+    published = iter([])
+    if ready:
+        sessions.prepare(conn, [account_id for account_id, _, _ in ready])
+        published = iter(loop.run_until_complete(publish_texts(sessions, ready, concurrency, interval)))
+
+    outcomes = [
+        next(published) if ok else RateLimited('Лимит публикаций аккаунта исчерпан, пост отложен')
+        for ok in allowed
+    ]
+    record_rate_limits(conn, schema, 'tweet', [
+        (item[0], outcome) for item, outcome in zip(items, outcomes) if isinstance(outcome, TooManyRequests)
+    ])
+    return outcomes
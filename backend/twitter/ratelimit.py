@@ -0,0 +1,152 @@
+from collections import Counter
+
+from twikit.errors import TooManyRequests
+
+from db import connection
+
+# Ёмкость корзины и скорость пополнения (токенов в секунду) по типу действия
+LIMITS = {
+    'tweet': (25, 300 / (3 * 3600)),
+    'like': (50, 1000 / (24 * 3600)),
+    # Чтение твитов пачками для метрик: на основном аккаунте, около 150 запросов за 15 минут
+    'lookup': (50, 150 / (15 * 60))
+}
+# Окно, за которое Twitter считает x-rate-limit-limit; лимит из заголовка, делённый на окно,
+# ограничивает скорость пополнения сверху
+HEADER_WINDOW_SECONDS = 15 * 60
+# После каждого 429 скорость пополнения уменьшается, но не ниже этой доли от исходной
+BACKOFF_FACTOR = 0.8
+MIN_REFILL_FACTOR = 0.25
+# Через столько минут без 429 после конца блокировки замедление снимается: скорость возвращается
+# к LIMITS или к лимиту из заголовков, если он ниже
+RECOVERY_MINUTES = 60
+# Если Twitter не прислал x-rate-limit-reset, аккаунт блокируется на это время
+DEFAULT_BLOCK_MINUTES = 15
+
+AVAILABLE = """
+    CASE WHEN b.blocked_until > CURRENT_TIMESTAMP THEN 0
+         ELSE LEAST(
+             b.capacity,
+             b.tokens + GREATEST(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - b.updated_at), 0) * b.refill_per_second
+         )
+    END
+"""
+# Блокировка закончилась давно и новых 429 не было: замедление после прошлых 429 пора снять
+QUIET = "b.blocked_until < CURRENT_TIMESTAMP - %(recovery_minutes)s * INTERVAL '1 minute'"
+# Скорость после затишья: из LIMITS, но не выше лимита из заголовков за окно и не ниже минимальной
+RECOVERED = "GREATEST(LEAST(%(refill)s, COALESCE(b.observed_limit / %(window)s, %(refill)s)), %(floor)s)"
+
+
+class RateLimited(Exception):
+    '''Бюджет аккаунта на действие исчерпан, работа отложена без запроса к Twitter'''
+
+
+def account_key(account_id) -> str:
+    return str(account_id) if account_id else 'main'
+
+
+def refill_bounds(action: str) -> dict:
+    '''Параметры запросов: исходная скорость, её нижняя граница и окно лимита из заголовков в секундах'''
+    refill = LIMITS[action][1]
+    return {'refill': refill, 'floor': refill * MIN_REFILL_FACTOR, 'window': float(HEADER_WINDOW_SECONDS)}
+
+
+def grant(conn, schema: str, action: str, account_ids: list) -> list:
+    '''Атомарно списывает по токену на каждый элемент; возвращает, каким элементам (по порядку) хватило бюджета'''
+    if not account_ids:
+        return []
+
+    wanted = Counter(account_key(account_id) for account_id in account_ids)
+    keys = list(wanted)
+    capacity, refill = LIMITS[action]
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        INSERT INTO {schema}.rate_limits (account_key, action, tokens, capacity, refill_per_second)
+        SELECT key, %s, %s, %s, %s FROM unnest(%s::text[]) AS key
+        ON CONFLICT (account_key, action) DO NOTHING
+    """, (action, capacity, capacity, refill, keys))
+    # Всё считается от заблокированной строки в SET, поэтому параллельные воркеры не теряют списания.
+    # Правые части SET видят строку до обновления: токены начисляются ещё по прежней скорости
+    cur.execute(f"""
+        UPDATE {schema}.rate_limits AS b
+        SET last_granted = LEAST(r.wanted, FLOOR({AVAILABLE}))::int,
+            tokens = {AVAILABLE} - LEAST(r.wanted, FLOOR({AVAILABLE})),
+            refill_per_second = CASE WHEN {QUIET} THEN {RECOVERED} ELSE b.refill_per_second END,
+            blocked_until = CASE WHEN {QUIET} THEN NULL ELSE b.blocked_until END,
+            updated_at = CURRENT_TIMESTAMP
+        FROM unnest(%(keys)s::text[], %(wanted)s::int[]) AS r (account_key, wanted)
+        WHERE b.account_key = r.account_key AND b.action = %(action)s
+        RETURNING b.account_key, b.last_granted
+    """, {
+        'keys': keys, 'wanted': [wanted[key] for key in keys], 'action': action,
+        'recovery_minutes': RECOVERY_MINUTES, **refill_bounds(action)
+    })
+    granted = dict(cur.fetchall())
+    conn.commit()
+    cur.close()
+
+    allowed = []
+    for account_id in account_ids:
+        key = account_key(account_id)
+        allowed.append(granted.get(key, 0) > 0)
+        if allowed[-1]:
+            granted[key] -= 1
+    return allowed
+
+
+def record_rate_limits(conn, schema: str, action: str, hits: list) -> None:
+    '''Запоминает ответы 429: обнуляет корзину до x-rate-limit-reset и замедляет её пополнение.
+    Лимит из x-rate-limit-limit за окно заголовков ограничивает скорость сверху; замедление снимает grant после затишья'''
+    if not hits:
+        return
+
+    cur = conn.cursor()
+    for account_id, error in hits:
+        headers = getattr(error, 'headers', None) or {}
+        limit = headers.get('x-rate-limit-limit')
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+        cur.execute(f"""
+            UPDATE {schema}.rate_limits
+            SET tokens = 0,
+                blocked_until = COALESCE(
+                    to_timestamp(%(reset)s)::timestamp,
+                    CURRENT_TIMESTAMP + %(block_minutes)s * INTERVAL '1 minute'
+                ),
+                refill_per_second = GREATEST(
+                    LEAST(refill_per_second * %(backoff)s, COALESCE(%(limit)s / %(window)s, refill_per_second)),
+                    %(floor)s
+                ),
+                rate_limited_count = rate_limited_count + 1,
+                observed_limit = COALESCE(%(limit)s, observed_limit),
+                observed_remaining = %(remaining)s,
+                observed_reset_at = to_timestamp(%(reset)s)::timestamp,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE account_key = %(key)s AND action = %(action)s
+        """, {
+            'reset': int(reset) if reset else None, 'block_minutes': DEFAULT_BLOCK_MINUTES,
+            'backoff': BACKOFF_FACTOR,
+            'limit': int(limit) if limit else None,
+            'remaining': int(remaining) if remaining else None,
+            'key': account_key(account_id), 'action': action,
+            **refill_bounds(action)
+        })
+    conn.commit()
+    cur.close()
+
+
+def take_one(schema: str, action: str, account_id) -> None:
+    '''Токен для одиночного запроса; без бюджета бросает RateLimited'''
+    with connection() as conn:
+        if not grant(conn, schema, action, [account_id])[0]:
+            raise RateLimited('Лимит действий аккаунта исчерпан, попробуйте позже')
+
+
+def note_rate_limit(schema: str, action: str, account_id, error: Exception) -> None:
+    with connection() as conn:
+        record_rate_limits(conn, schema, action, [(account_id, error)])
+
+
+def is_rate_limited(outcome) -> bool:
+    return isinstance(outcome, (RateLimited, TooManyRequests))
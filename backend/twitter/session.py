@@ -0,0 +1,244 @@
+import asyncio
+import json
+import time
+
+import httpx
+from twikit import Client
+from twikit.errors import Unauthorized
+
+from db import get_connection, release_connection
+from timing import span
+
+# Сессия старше этого срока считается протухшей и пересоздаётся через логин
+SESSION_MAX_AGE_DAYS = 30
+# После неудачного логина столько секунд не пробуем снова, а сразу отдаём ту же ошибку
+LOGIN_RETRY_SECONDS = 60
+# Соединения к Twitter держим открытыми между вызовами, чтобы тёплый контейнер не повторял TLS-рукопожатие
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+
+
+class CredentialsError(Exception):
+    '''Данные для входа не настроены или имеют неверный формат'''
+
+    def __init__(self, error: str, message: str):
+        super().__init__(message)
+        self.error = error
+        self.message = message
+
+
+class LoginError(Exception):
+    '''Twitter отклонил логин'''
+
+
+def credentials_version(schema: str) -> int:
+    '''Версия twitter_auth из cache_versions: её поднимает триггер, когда меняются данные для входа'''
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT version FROM {schema}.cache_versions WHERE name = 'twitter_auth'")
+        row = cur.fetchone()
+        cur.close()
+    finally:
+        release_connection(conn)
+    return row[0] if row else 0
+
+
+def load_credentials(schema: str) -> dict:
+    '''Читает последние данные для входа и сохранённые cookies сессии из twitter_auth'''
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT
+                id,
+                auth_token,
+                CASE WHEN session_updated_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                     THEN session_cookies END
+            FROM {schema}.twitter_auth
+            ORDER BY created_at DESC
+            LIMIT 1
+        """, (SESSION_MAX_AGE_DAYS,))
+        row = cur.fetchone()
+        cur.close()
+    finally:
+        release_connection(conn)
+
+    if not row or not row[1]:
+        raise CredentialsError(
+            'Twitter credentials not configured',
+            'Пожалуйста, добавьте данные для входа в настройках'
+        )
+
+    # auth_token на самом деле хранит username:password
+    credentials = row[1].split(':', 1)
+    if len(credentials) != 2:
+        raise CredentialsError(
+            'Invalid credentials format',
+            'Неверный формат данных. Используйте username:password'
+        )
+
+    return {
+        'id': row[0],
+        'username': credentials[0],
+        'password': credentials[1],
+        'session_cookies': row[2]
+    }
+
+
+def save_session_cookies(schema: str, auth_id: int, cookies: dict) -> None:
+    '''Сохраняет cookies свежей сессии рядом с данными для входа'''
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            UPDATE {schema}.twitter_auth
+            SET session_cookies = %s, session_updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (json.dumps(cookies), auth_id))
+        conn.commit()
+        cur.close()
+    finally:
+        release_connection(conn)
+
+
+def load_accounts(conn, schema: str, account_ids: list) -> dict:
+    '''Читает данные для входа и свежие cookies активных аккаунтов из accounts'''
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT
+            id,
+            username,
+            auth_token,
+            CASE WHEN session_updated_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                 THEN session_cookies END
+        FROM {schema}.accounts
+        WHERE id = ANY(%s) AND is_active = true
+    """, (SESSION_MAX_AGE_DAYS, account_ids))
+    rows = cur.fetchall()
+    cur.close()
+    return {
+        row[0]: {'id': row[0], 'username': row[1], 'auth_token': row[2], 'session_cookies': row[3]}
+        for row in rows
+    }
+
+
+def save_account_cookies(schema: str, account_id: int, cookies: dict) -> None:
+    '''Сохраняет cookies свежей сессии аккаунта'''
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            UPDATE {schema}.accounts
+            SET session_cookies = %s, session_updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (json.dumps(cookies), account_id))
+        conn.commit()
+        cur.close()
+    finally:
+        release_connection(conn)
+
+
+class TwitterSession:
+    '''Клиент twikit, который восстанавливает сохранённую сессию и логинится только при необходимости'''
+
+    def __init__(self, username: str, password, session_cookies, save_cookies):
+        self.username = username
+        self.password = password
+        self.save_cookies = save_cookies
+        self.client = Client('en-US', limits=HTTP_LIMITS)
+        self.restored = False
+        self.ready = False
+        # Номер текущей сессии: параллельные запросы, получившие 401 от одной и той же сессии, логинятся один раз
+        self.generation = 0
+        self._login_lock = asyncio.Lock()
+        self._login_error = None
+        self._login_failed_at = 0.0
+
+        if session_cookies:
+            self.client.set_cookies(json.loads(session_cookies))
+            self.restored = True
+            self.ready = True
+
+    async def login(self, seen_generation: int) -> None:
+        '''Полный логин с нуля и сохранение cookies новой сессии, если её ещё не обновил другой запрос'''
+        async with self._login_lock:
+            if self.generation != seen_generation:
+                return
+            if self._login_error is not None and time.monotonic() - self._login_failed_at < LOGIN_RETRY_SECONDS:
+                raise self._login_error
+            if self.password is None:
+                self._login_error = LoginError('Сессия отклонена, а пароля для повторного входа нет')
+                self._login_failed_at = time.monotonic()
+                raise self._login_error
+
+            self.client.set_cookies({}, clear_cookies=True)
+            try:
+                with span('twitter_login'):
+                    await self.client.login(auth_info_1=self.username, password=self.password)
+            except Exception as e:
+                self._login_error = LoginError(str(e))
+                self._login_failed_at = time.monotonic()
+                raise self._login_error from e
+
+            self._login_error = None
+
+            self.restored = False
+            self.ready = True
+            self.generation += 1
+            self.save_cookies(self.client.get_cookies())
+
+    async def call(self, action):
+        '''Выполняет запрос к Twitter; если сохранённую сессию отклонили, логинится заново и повторяет'''
+        if not self.ready:
+            await self.login(self.generation)
+
+        generation = self.generation
+        restored = self.restored
+        try:
+            with span('twitter'):
+                return await action(self.client)
+        except Unauthorized:
+            if not restored:
+                raise
+            await self.login(generation)
+            with span('twitter'):
+                return await action(self.client)
+
+    def close(self) -> None:
+        '''Закрывает HTTP-соединения клиента, когда сессия больше не нужна'''
+        loop = asyncio.get_event_loop()
+        if loop.is_running():
+            loop.create_task(self.client.http.aclose())
+        else:
+            loop.run_until_complete(self.client.http.aclose())
+
+    async def verify(self) -> None:
+        '''Проверяет, что сессия рабочая: восстановленную — запросом профиля, новую — логином'''
+        if self.ready:
+            await self.call(lambda client: client.user())
+        else:
+            await self.login(self.generation)
+
+
+def main_session(schema: str, auth: dict) -> TwitterSession:
+    '''Сессия основного аккаунта из twitter_auth'''
+    return TwitterSession(
+        auth['username'], auth['password'], auth['session_cookies'],
+        lambda cookies: save_session_cookies(schema, auth['id'], cookies)
+    )
+
+
+def account_session(schema: str, account: dict) -> TwitterSession:
+    '''Сессия аккаунта из accounts: auth_token хранит username:password или значение cookie auth_token'''
+    token = account['auth_token'] or ''
+    if ':' in token:
+        username, password = token.split(':', 1)
+        cookies = account['session_cookies']
+    else:
+        username, password = account['username'], None
+        cookies = account['session_cookies'] or json.dumps({'auth_token': token})
+
+    return TwitterSession(
+        username, password, cookies,
+        lambda cookies: save_account_cookies(schema, account['id'], cookies)
+    )
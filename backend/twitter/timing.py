@@ -0,0 +1,153 @@
+import functools
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+
+# Медленный запрос логируется вместе с текстами SQL; доля таких запросов, которые попадут в лог
+SLOW_REQUEST_MS = float(os.environ.get('TIMING_SLOW_MS', '2000'))
+SLOW_SAMPLE_RATE = float(os.environ.get('TIMING_SLOW_SAMPLE_RATE', '1'))
+MAX_SAMPLED_QUERIES = 50
+MAX_QUERY_LENGTH = 2000
+
+
+class Trace:
+    '''Отрезки времени одного вызова функции: имя -> [суммарные секунды, количество]'''
+    __slots__ = ('spans', 'queries')
+
+    def __init__(self):
+        self.spans = {}
+        # (текст запроса без параметров, секунды): параметры не храним, в них бывают пароли и токены
+        self.queries = []
+
+
+# Контейнер обрабатывает вызовы по одному, поэтому текущий трейс — переменная модуля
+_trace = None
+
+
+def record(name: str, seconds: float) -> None:
+    if _trace is None:
+        return
+    span = _trace.spans.get(name)
+    if span is None:
+        _trace.spans[name] = [seconds, 1]
+    else:
+        span[0] += seconds
+        span[1] += 1
+
+
+def record_query(query, seconds: float) -> None:
+    if _trace is None:
+        return
+    record('db', seconds)
+    _trace.queries.append((query, seconds))
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+class TimedCursor:
+    '''Примесь к классу курсора psycopg2: замеряет каждый execute; execute_values тоже идёт через него'''
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+
+_cursor_classes = {}
+
+
+def timed_cursor_class(factory):
+    cls = _cursor_classes.get(factory)
+    if cls is None:
+        cls = _cursor_classes[factory] = type('Timed' + factory.__name__, (TimedCursor, factory), {})
+    return cls
+
+
+def query_text(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)
+    return ' '.join(query.split())[:MAX_QUERY_LENGTH]
+
+
+def server_timing(trace: Trace, total: float) -> str:
+    parts = [
+        f'{name};dur={seconds * 1000:.1f};desc="x{count}"' if count > 1 else f'{name};dur={seconds * 1000:.1f}'
+        for name, (seconds, count) in trace.spans.items()
+    ]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def finish(function_name: str, event: dict, response, trace: Trace, total: float) -> None:
+    status = response.get('statusCode') if response else 500
+    line = {
+        'event': 'request',
+        'function': function_name,
+        'method': event.get('httpMethod'),
+        'status': status,
+        'total_ms': round(total * 1000, 1),
+        'spans': {name: round(seconds * 1000, 1) for name, (seconds, _) in trace.spans.items()},
+        'queries': len(trace.queries)
+    }
+    if total * 1000 >= SLOW_REQUEST_MS and random.random() < SLOW_SAMPLE_RATE:
+        line['slow_queries'] = [
+            {'ms': round(seconds * 1000, 1), 'sql': query_text(query)}
+            for query, seconds in sorted(trace.queries, key=lambda q: q[1], reverse=True)[:MAX_SAMPLED_QUERIES]
+        ]
+    print(json.dumps(line, ensure_ascii=False))
+
+    if response is not None:
+        # Заголовки ответа бывают общими словарями модуля, поэтому не меняем их, а собираем новый
+        response['headers'] = {
+            **(response.get('headers') or {}),
+            'Server-Timing': server_timing(trace, total),
+            'Timing-Allow-Origin': '*'
+        }
+
+
+def traced(function_name: str):
+    '''Оборачивает handler: собирает отрезки вызова, отдаёт их в Server-Timing и пишет одну строку лога'''
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event: dict, context):
+            global _trace
+            trace = _trace = Trace()
+            started = time.perf_counter()
+            try:
+                response = handler(event, context)
+            except Exception:
+                _trace = None
+                finish(function_name, event, None, trace, time.perf_counter() - started)
+                raise
+            _trace = None
+            finish(function_name, event, response, trace, time.perf_counter() - started)
+            return response
+        return wrapper
+    return decorate
@@ -0,0 +1,34 @@
+-- Таблицы, которые в продакшене созданы вне db_migrations; нужны, чтобы накатить миграции на пустую базу
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.accounts (
+    id SERIAL PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    auth_token TEXT NOT NULL,
+    avatar_url TEXT,
+    is_active BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.posts (
+    id SERIAL PRIMARY KEY,
+    account_id INTEGER REFERENCES t_p42702992_twitter_auto_post_bo.accounts(id),
+    content TEXT NOT NULL,
+    video_url TEXT,
+    video_name TEXT,
+    scheduled_time TIMESTAMP NOT NULL,
+    published_at TIMESTAMP,
+    status TEXT NOT NULL DEFAULT 'pending',
+    twitter_post_id TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.likes (
+    id SERIAL PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES t_p42702992_twitter_auto_post_bo.posts(id),
+    account_id INTEGER NOT NULL REFERENCES t_p42702992_twitter_auto_post_bo.accounts(id),
+    liked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_mutual BOOLEAN DEFAULT true,
+    delay_minutes INTEGER,
+    UNIQUE (post_id, account_id)
+);
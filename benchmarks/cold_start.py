@@ -0,0 +1,104 @@
+'''Холодный старт функций: время импорта index.py и первого ответа в свежем процессе.
+
+Каждый замер — отдельный процесс python, как новый контейнер. Без базы проверяются OPTIONS
+и ошибка валидации; с --get и настоящим DATABASE_URL добавляется первый GET:
+    python benchmarks/cold_start.py --runs 10
+    python benchmarks/cold_start.py --ref HEAD~1          # то же для другой ревизии из git
+    DATABASE_URL=... python benchmarks/cold_start.py --get
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FUNCTIONS = ('accounts', 'posts', 'likes', 'twitter-settings', 'twitter')
+
+EVENTS = {
+    'options': {'httpMethod': 'OPTIONS'},
+    'invalid': {'httpMethod': 'POST', 'body': '{}'},
+    'get': {'httpMethod': 'GET', 'queryStringParameters': {}}
+}
+# Для twitter пустое тело — это публикация без текста; лайк без tweetId тоже отсекается валидацией
+INVALID_EVENTS = {'twitter': {'httpMethod': 'POST', 'body': '{"action": "like"}'}}
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+try:
+    status = index.handler(json.loads(sys.argv[1]), None)['statusCode']
+except Exception as e:
+    status = type(e).__name__
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_ms': (finished - imported) * 1000,
+    'status': status,
+    'twikit': 'twikit' in sys.modules,
+    'psycopg2': 'psycopg2' in sys.modules
+}))
+'''
+
+
+def probe(function_dir: str, event: dict) -> dict:
+    env = dict(os.environ)
+    # Проверка DATABASE_URL в twitter и twitter-settings срабатывает раньше валидации, поэтому нужен хоть какой-то
+    env.setdefault('DATABASE_URL', 'postgresql://localhost/cold_start')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(event)],
+        cwd=function_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1]}
+    # Перед результатом пробы handler печатает свою строку лога (timing.finish); результат — последняя строка
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def export_ref(ref: str) -> str:
+    '''Выгружает backend нужной ревизии во временный каталог'''
+    target = tempfile.mkdtemp(prefix='cold_start_')
+    archive = subprocess.run(['git', 'archive', ref, 'backend'], cwd=ROOT, capture_output=True, check=True)
+    subprocess.run(['tar', '-x', '-C', target], input=archive.stdout, check=True)
+    return os.path.join(target, 'backend')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ref', help='git-ревизия вместо рабочего дерева')
+    parser.add_argument('--get', action='store_true', help='замерить и первый GET (нужна база)')
+    args = parser.parse_args()
+
+    backend = export_ref(args.ref) if args.ref else os.path.join(ROOT, 'backend')
+    kinds = ['options', 'invalid'] + (['get'] if args.get else [])
+
+    print(f'{"function":<18}{"event":<9}{"import p50":>12}{"first p50":>12}  status  loaded')
+    for function in FUNCTIONS:
+        for kind in kinds:
+            if kind == 'get' and function == 'twitter':
+                # GET в twitter логинится в Twitter — это уже не холодный старт функции
+                continue
+            event = INVALID_EVENTS.get(function, EVENTS[kind]) if kind == 'invalid' else EVENTS[kind]
+            samples = [probe(os.path.join(backend, function), event) for _ in range(args.runs)]
+            failed = [sample['error'] for sample in samples if 'error' in sample]
+            if failed:
+                print(f'{function:<18}{kind:<9}  failed: {failed[0]}')
+                continue
+            loaded = ','.join(name for name in ('psycopg2', 'twikit') if samples[-1][name]) or '-'
+            print(
+                f'{function:<18}{kind:<9}'
+                f'{statistics.median(s["import_ms"] for s in samples):>9.1f} ms'
+                f'{statistics.median(s["first_ms"] for s in samples):>9.1f} ms'
+                f'  {samples[-1]["status"]:<6}  {loaded}'
+            )
+
+
+if __name__ == '__main__':
+    main()
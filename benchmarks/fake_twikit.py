@@ -0,0 +1,134 @@
+'''Подмена twikit для нагрузочного стенда: те же классы и методы, что использует backend/twitter,
+но вместо Twitter — задержка и ошибки с заданной вероятностью.
+
+install() регистрирует модули twikit и twikit.errors в sys.modules до импорта функции.
+'''
+import asyncio
+import itertools
+import random
+import sys
+import time
+import types
+
+CONFIG = {'latency_ms': 80.0, 'jitter_ms': 40.0, 'error_rate': 0.0, 'rate_limit_rate': 0.0}
+_ids = itertools.count(10 ** 18)
+
+
+class TwitterException(Exception):
+    pass
+
+
+class Unauthorized(TwitterException):
+    pass
+
+
+class TooManyRequests(TwitterException):
+    def __init__(self, message: str, headers: dict = None):
+        super().__init__(message)
+        self.headers = headers or {}
+
+
+async def respond() -> None:
+    '''Задержка сетевого запроса и случайный отказ, как у настоящего API'''
+    delay = CONFIG['latency_ms'] + random.uniform(-1, 1) * CONFIG['jitter_ms']
+    await asyncio.sleep(max(0.0, delay) / 1000)
+    roll = random.random()
+    if roll < CONFIG['rate_limit_rate']:
+        raise TooManyRequests('Rate limit exceeded', {
+            'x-rate-limit-limit': '300',
+            'x-rate-limit-remaining': '0',
+            'x-rate-limit-reset': str(int(time.time()) + 60)
+        })
+    if roll < CONFIG['rate_limit_rate'] + CONFIG['error_rate']:
+        raise TwitterException('Fake Twitter error')
+
+
+class Tweet:
+    def __init__(self, text: str, tweet_id: str = None):
+        self.id = tweet_id or str(next(_ids))
+        self.text = text
+        self.favorite_count = random.randint(0, 500)
+        self.retweet_count = random.randint(0, 50)
+        self.reply_count = random.randint(0, 20)
+        self.quote_count = random.randint(0, 5)
+        self.view_count = str(random.randint(100, 50000))
+
+
+class User:
+    def __init__(self, screen_name: str):
+        self.screen_name = screen_name
+
+
+class FakeHttp:
+    async def aclose(self) -> None:
+        pass
+
+
+class V11:
+    async def upload_media_init(self, media_type, total_bytes, media_category, is_long_video):
+        await respond()
+        return {'media_id_string': str(next(_ids))}, None
+
+    async def upload_media_append(self, is_long_video, media_id, segment_index, chunk_stream):
+        await respond()
+        return None, None
+
+    async def upload_media_finelize(self, is_long_video, media_id):
+        await respond()
+        return {}, None
+
+    async def upload_media_status(self, is_long_video, media_id):
+        await respond()
+        return {}, None
+
+
+class Client:
+    def __init__(self, language: str = 'en-US', **kwargs):
+        self.http = FakeHttp()
+        self.v11 = V11()
+        self._cookies = {}
+        self._username = None
+
+    async def login(self, auth_info_1: str, password: str, **kwargs) -> None:
+        await respond()
+        self._username = auth_info_1
+        self._cookies = {'auth_token': f'fake-{auth_info_1}', 'ct0': 'fake'}
+
+    def get_cookies(self) -> dict:
+        return dict(self._cookies)
+
+    def set_cookies(self, cookies: dict, clear_cookies: bool = False) -> None:
+        if clear_cookies:
+            self._cookies = {}
+        self._cookies.update(cookies)
+
+    async def create_tweet(self, text: str = '', media_ids: list = None, **kwargs) -> Tweet:
+        await respond()
+        return Tweet(text)
+
+    async def favorite_tweet(self, tweet_id: str) -> None:
+        await respond()
+
+    async def get_tweets_by_ids(self, ids: list) -> list:
+        await respond()
+        return [Tweet('', tweet_id) for tweet_id in ids]
+
+    async def user(self) -> User:
+        await respond()
+        return User(self._username or 'fake')
+
+
+def install(latency_ms: float, jitter_ms: float, error_rate: float, rate_limit_rate: float) -> None:
+    CONFIG.update(latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate, rate_limit_rate=rate_limit_rate)
+
+    errors = types.ModuleType('twikit.errors')
+    errors.TwitterException = TwitterException
+    errors.Unauthorized = Unauthorized
+    errors.TooManyRequests = TooManyRequests
+
+    twikit = types.ModuleType('twikit')
+    twikit.Client = Client
+    twikit.errors = errors
+
+    sys.modules['twikit'] = twikit
+    sys.modules['twikit.errors'] = errors
@@ -0,0 +1,155 @@
+'''Распределение лайкеров: прежний независимый random.sample на каждый пост против backend/likes/assignment.py
+по всему пулу и по выборке кандидатов одиночных POST (только случайной и с должниками во главе).
+
+Без базы, на синтетике: авторы постов распределены неравномерно (немногие аккаунты пишут много),
+у части аккаунтов уже есть лайки за сегодня и накопленный баланс взаимности:
+    python benchmarks/like_assignment.py --accounts 100000 --posts 10000 --likes 5
+    python benchmarks/like_assignment.py --batches 5        # несколько пачек подряд, баланс переносится
+'''
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'likes'))
+from assignment import assign_likers  # noqa: E402
+
+# Как в backend/likes/index.py: выборка кандидатов для одиночных POST
+SAMPLED_MAX_LIKES = 500
+CANDIDATES_PER_LIKE = 4
+DEBTORS_PER_LIKE = 2
+# Сколько одиночных POST проходит между перечитываниями списка должников (его TTL в контейнере)
+DEBTORS_REFRESH_POSTS = 100
+
+
+def random_sampling(posts, account_ids, given_today, balance, daily_cap, reciprocity=True, rng=None):
+    '''Прежний выбор из likes/index.py: random.sample на пост, без счётчиков и потолков'''
+    assignments = []
+    for post_id, author_id, count in posts:
+        picked = random.sample(account_ids, min(count + 1, len(account_ids)))
+        assignments.extend((post_id, account_id) for account_id in [a for a in picked if a != author_id][:count])
+    return assignments
+
+
+def sampled(debtors: bool):
+    '''Одиночные POST по одному посту: выборка CANDIDATES_PER_LIKE кандидатов на лайк, с должниками
+    во главе или только случайная; счётчики между постами обновляются, как их обновила бы сводка'''
+    def strategy(posts, account_ids, given_today, balance, daily_cap, reciprocity=True, rng=None):
+        given_today = dict(given_today)
+        balance = dict(balance)
+        top = []
+        assignments = []
+        for n, (post_id, author_id, count) in enumerate(posts):
+            size = count * CANDIDATES_PER_LIKE
+            if debtors and n % DEBTORS_REFRESH_POSTS == 0:
+                top = heapq.nlargest(
+                    SAMPLED_MAX_LIKES * DEBTORS_PER_LIKE,
+                    (a for a, value in balance.items() if value > 0), key=balance.get
+                )
+            candidates = random.sample(top, min(count * DEBTORS_PER_LIKE, len(top))) if debtors else []
+            seen = set(candidates)
+            for account_id in random.sample(account_ids, size):
+                if len(candidates) == size:
+                    break
+                if account_id not in seen:
+                    candidates.append(account_id)
+                    seen.add(account_id)
+            # Как like_counters(cur, candidates): счётчики только кандидатов
+            picked = assign_likers(
+                [(post_id, author_id, count)], candidates,
+                {a: given_today[a] for a in candidates if a in given_today},
+                {a: balance[a] for a in candidates if a in balance},
+                daily_cap, reciprocity, rng
+            )
+            for _, account_id in picked:
+                given_today[account_id] = given_today.get(account_id, 0) + 1
+                balance[account_id] = balance.get(account_id, 0) - 1
+                balance[author_id] = balance.get(author_id, 0) + 1
+            assignments.extend(picked)
+        return assignments
+    return strategy
+
+
+def make_state(accounts: int, daily_cap: int, seed: int) -> tuple:
+    rng = random.Random(seed)
+    account_ids = list(range(1, accounts + 1))
+    # Пятая часть аккаунтов уже лайкала сегодня, треть имеет ненулевой баланс за неделю
+    given_today = {a: rng.randint(0, daily_cap) for a in rng.sample(account_ids, accounts // 5)}
+    balance = {a: rng.randint(-30, 30) for a in rng.sample(account_ids, accounts // 3)}
+    return account_ids, given_today, balance
+
+
+def make_posts(accounts: int, posts: int, likes: int, rng: random.Random, first_id: int) -> list:
+    return [
+        (first_id + n, 1 + int(accounts * rng.random() ** 3), max(1, int(rng.gauss(likes, likes / 3))))
+        for n in range(posts)
+    ]
+
+
+def run(strategy, args) -> dict:
+    account_ids, given_today, balance = make_state(args.accounts, args.daily_cap, args.seed)
+    rng = random.Random(args.seed + 1)
+    random.seed(args.seed + 2)
+    seconds = 0.0
+    assigned = 0
+    pairs = set()
+    repeated = 0
+    for batch in range(args.batches):
+        posts = make_posts(args.accounts, args.posts, args.likes, rng, batch * args.posts)
+        authors = {post_id: author for post_id, author, _ in posts}
+        started = time.perf_counter()
+        assignments = strategy(posts, account_ids, given_today, balance, args.daily_cap, True, rng)
+        seconds += time.perf_counter() - started
+        assigned += len(assignments)
+
+        for post_id, account_id in assignments:
+            author = authors[post_id]
+            given_today[account_id] = given_today.get(account_id, 0) + 1
+            balance[account_id] = balance.get(account_id, 0) - 1
+            balance[author] = balance.get(author, 0) + 1
+            pair = (account_id, author)
+            repeated += pair in pairs
+            pairs.add(pair)
+
+    load = [given_today.get(a, 0) for a in account_ids]
+    return {
+        'seconds': seconds,
+        'assigned': assigned,
+        'over_cap': sum(1 for value in load if value > args.daily_cap),
+        'load_max': max(load),
+        'load_stdev': statistics.pstdev(load),
+        'balance_abs': sum(abs(value) for value in balance.values()) / len(account_ids),
+        'repeated_pairs': repeated
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=100000)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--likes', type=int, default=5, help='среднее число лайков на пост')
+    parser.add_argument('--daily-cap', type=int, default=50)
+    parser.add_argument('--batches', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f'{"strategy":<18}{"seconds":>9}{"assigned":>10}{"over cap":>10}{"max load":>10}'
+          f'{"load sd":>9}{"|balance|":>11}{"repeats":>9}')
+    strategies = (
+        ('random.sample', random_sampling), ('assign_likers', assign_likers),
+        ('sampled', sampled(False)), ('sampled+debtors', sampled(True))
+    )
+    for name, strategy in strategies:
+        result = run(strategy, args)
+        print(
+            f'{name:<18}{result["seconds"]:>9.2f}{result["assigned"]:>10}{result["over_cap"]:>10}'
+            f'{result["load_max"]:>10}{result["load_stdev"]:>9.2f}{result["balance_abs"]:>11.2f}'
+            f'{result["repeated_pairs"]:>9}'
+        )
+
+
+if __name__ == '__main__':
+    main()
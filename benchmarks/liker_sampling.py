@@ -0,0 +1,140 @@
+'''Бенчмарк выбора лайкеров: ORDER BY RANDOM() против выборки кандидатов из закэшированного массива id.
+
+Выборка повторяет одиночный POST функции likes: random.sample кандидатов, их счётчики из сводки
+и распределение backend/likes/assignment.py по ним. Для сравнения — тот же движок по всему пулу.
+
+Запуск на одноразовой базе:
+    BENCH_DATABASE_URL=postgresql://localhost/bench python benchmarks/liker_sampling.py --sizes 1000 10000 100000
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'likes'))
+from assignment import assign_likers  # noqa: E402
+
+# Как в backend/likes/index.py
+CANDIDATES_PER_LIKE = 4
+DAILY_LIKE_CAP = 1000
+
+
+def timed(fn, repeats: int) -> float:
+    '''Медиана времени вызова в миллисекундах'''
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def setup_pool(cur, size: int) -> None:
+    cur.execute('DROP TABLE IF EXISTS bench_accounts')
+    cur.execute('CREATE TEMP TABLE bench_accounts (id SERIAL PRIMARY KEY, is_active BOOLEAN NOT NULL)')
+    cur.execute('''
+        INSERT INTO bench_accounts (is_active)
+        SELECT random() < 0.9 FROM generate_series(1, %s)
+    ''', (size,))
+    cur.execute('CREATE TEMP TABLE IF NOT EXISTS bench_versions (name TEXT PRIMARY KEY, version BIGINT)')
+    cur.execute("INSERT INTO bench_versions VALUES ('accounts', 1) ON CONFLICT DO NOTHING")
+    # Сводка за неделю у трети аккаунтов, как account_daily_stats
+    cur.execute('DROP TABLE IF EXISTS bench_daily_stats')
+    cur.execute('''
+        CREATE TEMP TABLE bench_daily_stats (
+            account_id INTEGER NOT NULL, day DATE NOT NULL,
+            likes_given INTEGER NOT NULL, likes_received INTEGER NOT NULL,
+            PRIMARY KEY (account_id, day)
+        )
+    ''')
+    cur.execute('''
+        INSERT INTO bench_daily_stats
+        SELECT a.id, CURRENT_DATE - d, (random() * 20)::int, (random() * 20)::int
+        FROM bench_accounts a, generate_series(0, 6) AS d
+        WHERE a.id % 3 = 0
+    ''')
+    cur.execute('ANALYZE bench_accounts')
+    cur.execute('ANALYZE bench_daily_stats')
+
+
+def counters(cur, account_ids) -> tuple:
+    '''Как like_counters: сегодняшние лайки и баланс за неделю, только по account_ids или по всем'''
+    only = '' if account_ids is None else 'account_id = ANY(%s) AND'
+    params = (7,) if account_ids is None else (account_ids, 7)
+    cur.execute(f'''
+        SELECT account_id,
+               COALESCE(SUM(likes_given) FILTER (WHERE day = CURRENT_DATE), 0),
+               SUM(likes_received) - SUM(likes_given)
+        FROM bench_daily_stats
+        WHERE {only} day > CURRENT_DATE - %s
+        GROUP BY account_id
+    ''', params)
+    given_today = {}
+    balance = {}
+    for account_id, given, owed in cur.fetchall():
+        given_today[account_id] = given
+        balance[account_id] = owed
+    return given_today, balance
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 300000])
+    parser.add_argument('--likes', type=int, default=5, help='сколько лайкеров выбирать на пост')
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['BENCH_DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    print(f'{"pool":>8} {"ORDER BY RANDOM() ms":>22} {"sampled engine ms":>19} {"full engine ms":>16} {"cache load ms":>15}')
+    for size in args.sizes:
+        setup_pool(cur, size)
+        author_id = 1
+
+        def order_by_random():
+            cur.execute('''
+                SELECT id FROM bench_accounts
+                WHERE is_active = true AND id != %s
+                ORDER BY RANDOM()
+                LIMIT %s
+            ''', (author_id, args.likes))
+            cur.fetchall()
+
+        ids = []
+
+        def load_cache():
+            cur.execute('SELECT id FROM bench_accounts WHERE is_active = true')
+            ids[:] = [row[0] for row in cur.fetchall()]
+
+        def sampled_engine():
+            # Как одиночный POST в likes: версия по первичному ключу, выборка O(k) из массива,
+            # счётчики только кандидатов и распределение по ним
+            cur.execute("SELECT version FROM bench_versions WHERE name = 'accounts'")
+            cur.fetchone()
+            candidates = random.sample(ids, min(args.likes * CANDIDATES_PER_LIKE, len(ids)))
+            given_today, balance = counters(cur, candidates)
+            assign_likers([(1, author_id, args.likes)], candidates, given_today, balance, DAILY_LIKE_CAP)
+
+        def full_engine():
+            # Тот же движок по всему пулу со счётчиками всех аккаунтов: так распределяются большие пачки
+            given_today, balance = counters(cur, None)
+            assign_likers([(1, author_id, args.likes)], ids, given_today, balance, DAILY_LIKE_CAP)
+
+        random_ms = timed(order_by_random, args.repeats)
+        load_ms = timed(load_cache, 3)
+        sampled_ms = timed(sampled_engine, args.repeats)
+        full_ms = timed(full_engine, max(3, args.repeats // 10))
+        print(f'{size:>8} {random_ms:>22.2f} {sampled_ms:>19.3f} {full_ms:>16.2f} {load_ms:>15.2f}')
+
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+'''Нагрузочный стенд: все пять функций вызываются через handler(event, context) на одноразовой базе.
+
+Схема пересоздаётся с нуля (base_schema.sql + все db_migrations), заполняется синтетикой нужного
+масштаба, twikit подменяется fake_twikit с настраиваемой задержкой и долей ошибок. На выходе —
+p50/p95/p99 и пропускная способность по каждой паре функция/метод/сценарий.
+
+    BENCH_DATABASE_URL=postgresql://localhost/bench python benchmarks/load_harness.py \\
+        --accounts 5000 --posts 50000 --likes 200000 --requests 200 \\
+        --twitter-latency-ms 80 --twitter-error-rate 0.02
+
+Внимание: схема t_p42702992_twitter_auto_post_bo в базе BENCH_DATABASE_URL удаляется.
+'''
+import argparse
+import contextlib
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+import fake_twikit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCHEMA = 't_p42702992_twitter_auto_post_bo'
+
+
+def prepare_database(dsn: str, accounts: int, posts: int, likes: int) -> None:
+    '''Пересоздаёт схему, накатывает миграции по порядку версий и заливает синтетику'''
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    cur.execute(f'CREATE SCHEMA {SCHEMA}')
+
+    scripts = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_schema.sql')]
+    scripts += sorted(
+        glob.glob(os.path.join(ROOT, 'db_migrations', 'V*.sql')),
+        key=lambda path: int(os.path.basename(path)[1:].split('__')[0])
+    )
+    for path in scripts:
+        with open(path, encoding='utf-8') as f:
+            cur.execute(f.read())
+
+    cur.execute(f'SET search_path TO {SCHEMA}')
+    cur.execute("INSERT INTO twitter_auth (auth_token) VALUES ('bench_main:password')")
+    cur.execute('''
+        INSERT INTO accounts (username, auth_token, avatar_url, is_active, created_at)
+        SELECT 'bench_' || g, 'bench_' || g || ':password', '', g %% 10 <> 0,
+               CURRENT_TIMESTAMP - g * INTERVAL '1 minute'
+        FROM generate_series(1, %s) g
+    ''', (accounts,))
+    # Треть постов опубликована, 2% созрели к публикации, остальные запланированы на будущее
+    cur.execute('''
+        INSERT INTO posts (account_id, content, scheduled_time, status, published_at, twitter_post_id, created_at)
+        SELECT
+            1 + g %% %s,
+            'Synthetic post #' || g,
+            CASE WHEN g %% 3 = 0 OR g %% 50 = 1 THEN CURRENT_TIMESTAMP - (g %% 720) * INTERVAL '1 hour'
+                 ELSE CURRENT_TIMESTAMP + (g %% 720) * INTERVAL '1 hour' END,
+            CASE WHEN g %% 3 = 0 THEN 'published' ELSE 'pending' END,
+            CASE WHEN g %% 3 = 0 THEN CURRENT_TIMESTAMP - (g %% 720) * INTERVAL '1 hour' END,
+            CASE WHEN g %% 3 = 0 THEN (1000000000000000000 + g)::text END,
+            CURRENT_TIMESTAMP - (g %% 720) * INTERVAL '1 hour'
+        FROM generate_series(1, %s) g
+    ''', (accounts, posts))
+    cur.execute('''
+        INSERT INTO likes (post_id, account_id, liked_at, is_mutual, delay_minutes, status)
+        SELECT post_id, account_id, CURRENT_TIMESTAMP - random() * INTERVAL '2 days', true, 5,
+               CASE WHEN random() < 0.05 THEN 'pending' ELSE 'done' END
+        FROM (
+            SELECT 1 + floor(random() * %s)::int AS post_id, 1 + floor(random() * %s)::int AS account_id
+            FROM generate_series(1, %s)
+        ) AS pairs
+        ON CONFLICT DO NOTHING
+    ''', (posts, accounts, likes))
+    cur.execute('''
+        UPDATE posts AS p SET likes_count = c.count
+        FROM (SELECT post_id, COUNT(*) AS count FROM likes GROUP BY post_id) AS c
+        WHERE p.id = c.post_id
+    ''')
+    cur.execute('ANALYZE')
+    cur.close()
+    conn.close()
+
+
+def scenarios(scale: dict) -> list:
+    '''(функция, метод, сценарий, доля от --requests, фабрика события по номеру запроса)'''
+    def account():
+        return random.randint(1, scale['accounts'])
+
+    def post():
+        return random.randint(1, scale['posts'])
+
+    def get(params=None, headers=None):
+        return lambda i: {'httpMethod': 'GET', 'queryStringParameters': params or {}, 'headers': headers or {}}
+
+    def body(method, payload_fn):
+        return lambda i: {'httpMethod': method, 'body': json.dumps(payload_fn(i)), 'headers': {}}
+
+    return [
+        ('accounts', 'GET', 'first page', 1.0, get({'limit': '50'})),
+        ('accounts', 'GET', 'ndjson 1000', 0.5, get({'limit': '1000', 'format': 'ndjson'})),
+        ('accounts', 'POST', 'create', 0.5, body('POST', lambda i: {
+            'username': f'harness_{time.time_ns()}_{i}', 'authToken': 'harness:password'})),
+        ('accounts', 'PUT', 'toggle', 0.5, body('PUT', lambda i: {'id': account(), 'isActive': random.random() < 0.9})),
+        ('posts', 'GET', 'first page', 1.0, get({'limit': '50'})),
+        ('posts', 'GET', 'by account', 1.0, lambda i: get({'accountId': str(account())})(i)),
+        ('posts', 'POST', 'create', 0.5, body('POST', lambda i: {
+            'accountId': account(), 'content': f'Harness post {i}', 'scheduledTime': '2099-01-01T10:00:00Z'})),
+        ('posts', 'POST', 'bulk 100', 0.1, body('POST', lambda i: {'posts': [
+            {'accountId': account(), 'content': f'Calendar {i}/{n}',
+             'scheduledTime': f'2099-{1 + n % 12:02d}-{1 + i % 28:02d}T{n % 24:02d}:{random.randint(0, 59):02d}:00Z'}
+            for n in range(100)
+        ]})),
+        ('posts', 'PUT', 'status', 0.5, body('PUT', lambda i: {'id': post(), 'status': 'pending'})),
+        ('likes', 'GET', 'latest 100', 1.0, get()),
+        ('likes', 'GET', 'by post', 1.0, lambda i: get({'postId': str(post())})(i)),
+        ('likes', 'POST', 'single', 0.5, body('POST', lambda i: {'postId': post(), 'likesCount': 3})),
+        ('likes', 'POST', 'bulk 100', 0.1, body('POST', lambda i: {
+            'posts': [{'postId': post(), 'likesCount': 3} for _ in range(100)]})),
+        ('twitter-settings', 'GET', 'status', 1.0, get()),
+        ('twitter-settings', 'POST', 'save', 0.2, body('POST', lambda i: {'username': 'bench_main', 'password': 'password'})),
+        ('twitter', 'GET', 'verify', 0.5, get()),
+        ('twitter', 'POST', 'tweet', 0.5, body('POST', lambda i: {'text': f'Harness tweet {i}'})),
+        ('twitter', 'POST', 'tweet as account', 0.5, body('POST', lambda i: {
+            'text': f'Harness tweet {i}', 'accountId': account()})),
+        ('twitter', 'POST', 'sync metrics', 0.1, body('POST', lambda i: {'action': 'sync-metrics', 'limit': 500})),
+        ('twitter', 'POST', 'like', 0.5, body('POST', lambda i: {
+            'action': 'like', 'tweetId': str(10 ** 18 + post()), 'accountId': account()})),
+        ('twitter', 'POST', 'dispatch', 0.05, body('POST', lambda i: {'action': 'dispatch', 'batchSize': 20})),
+        ('twitter', 'POST', 'execute-likes', 0.05, body('POST', lambda i: {'action': 'execute-likes'})),
+    ]
+
+
+def load_function(name: str):
+    '''Импортирует index.py функции; модули предыдущей функции с теми же именами (db, index, ...) выгружаются'''
+    previous_db = sys.modules.get('db')
+    if previous_db is not None:
+        for conn, _ in previous_db.POOL._idle:
+            conn.close()
+    for path in glob.glob(os.path.join(ROOT, 'backend', '*', '*.py')):
+        sys.modules.pop(os.path.splitext(os.path.basename(path))[0], None)
+    # Путь остаётся в sys.path на время прогона: модули функции подгружаются лениво внутри handler
+    sys.path.insert(0, os.path.join(ROOT, 'backend', name))
+    import index
+    return index
+
+
+def percentile(sorted_samples: list, share: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * share))]
+
+
+def run(args) -> list:
+    results = []
+    scale = {'accounts': args.accounts, 'posts': args.posts}
+    current = None
+    index = None
+
+    for function, method, name, share, make_event in scenarios(scale):
+        if args.only and function not in args.only:
+            continue
+        if function != current:
+            if current:
+                sys.path.remove(os.path.join(ROOT, 'backend', current))
+            index = load_function(function)
+            current = function
+            if function == 'twitter' and not args.keep_rate_limits:
+                # Корзины лимитов иначе закончатся через несколько десятков твитов и стенд будет мерить 429
+                import ratelimit
+                ratelimit.LIMITS = {action: (10 ** 9, 10 ** 6) for action in ratelimit.LIMITS}
+
+        requests = max(1, int(args.requests * share))
+        samples = []
+        statuses = {}
+        # Функции пишут структурные логи в stdout; отчёту они только мешают
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            for i in range(requests):
+                event = make_event(i)
+                call_started = time.perf_counter()
+                response = index.handler(event, None)
+                samples.append((time.perf_counter() - call_started) * 1000)
+                statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+            elapsed = time.perf_counter() - started
+
+        samples.sort()
+        results.append({
+            'function': function,
+            'method': method,
+            'scenario': name,
+            'requests': requests,
+            'statuses': statuses,
+            'p50_ms': round(percentile(samples, 0.50), 2),
+            'p95_ms': round(percentile(samples, 0.95), 2),
+            'p99_ms': round(percentile(samples, 0.99), 2),
+            'rps': round(requests / elapsed, 1)
+        })
+    return results
+
+
+def print_report(results: list) -> None:
+    print(f'{"function":<18}{"method":<7}{"scenario":<18}{"n":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>9}  statuses')
+    for r in results:
+        statuses = ' '.join(f'{code}:{count}' for code, count in sorted(r['statuses'].items()))
+        print(
+            f'{r["function"]:<18}{r["method"]:<7}{r["scenario"]:<18}{r["requests"]:>6}'
+            f'{r["p50_ms"]:>10.2f}{r["p95_ms"]:>10.2f}{r["p99_ms"]:>10.2f}{r["rps"]:>9.1f}  {statuses}'
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--likes', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий с долей 1.0')
+    parser.add_argument('--only', nargs='+', help='только эти функции')
+    parser.add_argument('--twitter-latency-ms', type=float, default=80.0)
+    parser.add_argument('--twitter-jitter-ms', type=float, default=40.0)
+    parser.add_argument('--twitter-error-rate', type=float, default=0.0)
+    parser.add_argument('--twitter-429-rate', type=float, default=0.0)
+    parser.add_argument('--keep-rate-limits', action='store_true', help='не поднимать лимиты корзин для стенда')
+    parser.add_argument('--no-response-cache', action='store_true', help='выключить кэш ответов GET в контейнере')
+    parser.add_argument('--skip-setup', action='store_true', help='использовать уже заполненную схему')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='сохранить результаты в файл для сравнения прогонов')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    dsn = os.environ['BENCH_DATABASE_URL']
+    if not args.skip_setup:
+        started = time.perf_counter()
+        prepare_database(dsn, args.accounts, args.posts, args.likes)
+        print(f'schema and synthetic data ready in {time.perf_counter() - started:.1f} s', file=sys.stderr)
+
+    # Функции без префикса схемы находят таблицы через search_path, twitter и twitter-settings — через MAIN_DB_SCHEMA
+    os.environ['DATABASE_URL'] = make_dsn(dsn, options=f'-c search_path={SCHEMA}')
+    os.environ['MAIN_DB_SCHEMA'] = SCHEMA
+    if args.no_response_cache:
+        os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+    fake_twikit.install(
+        args.twitter_latency_ms, args.twitter_jitter_ms, args.twitter_error_rate, args.twitter_429_rate
+    )
+
+    results = run(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''Сериализация списков: прежний путь (isoformat в цикле + json.dumps) против backend/*/response.py.
+
+Строки собираются как из RealDictCursor для GET /posts, без базы:
+    python benchmarks/serialization.py --rows 10000 --repeat 20
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'posts'))
+import response  # noqa: E402
+
+
+class RealDictRow(dict):
+    '''Как psycopg2.extras.RealDictRow: подкласс dict, чтобы бенчмарк не требовал psycopg2'''
+
+
+def make_rows(count: int) -> list:
+    started = datetime(2026, 1, 1, 9, 0, 0, 123456)
+    rows = []
+    for i in range(count):
+        rows.append(RealDictRow({
+            'id': i,
+            'content': f'Пост номер {i} с каким-то текстом для твита',
+            'video_url': None,
+            'video_name': None,
+            'scheduled_time': started + timedelta(minutes=i),
+            'published_at': started + timedelta(minutes=i, seconds=30) if i % 2 else None,
+            'status': 'published' if i % 2 else 'pending',
+            'twitter_post_id': str(10 ** 18 + i) if i % 2 else None,
+            'created_at': started,
+            'likes_count': i % 17,
+            'account_username': f'user_{i % 500}'
+        }))
+    return rows
+
+
+def legacy(rows: list) -> str:
+    # Прежний код обработчиков: мутирует каждую строку, затем json.dumps
+    for post in rows:
+        if post['scheduled_time']:
+            post['scheduled_time'] = post['scheduled_time'].isoformat()
+        if post['published_at']:
+            post['published_at'] = post['published_at'].isoformat()
+        if post['created_at']:
+            post['created_at'] = post['created_at'].isoformat()
+    return json.dumps({'posts': rows, 'nextCursor': None})
+
+
+def stdlib_default(rows: list) -> str:
+    return json.dumps({'posts': rows, 'nextCursor': None}, default=response.encode_value)
+
+
+def measure(name: str, fn, rows_count: int, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        # legacy портит строки, поэтому каждый прогон получает свежие
+        rows = make_rows(rows_count)
+        started = time.perf_counter()
+        fn(rows)
+        samples.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(samples)
+    print(f'{name:<28} p50 {median:>8.2f} ms  min {min(samples):>8.2f} ms')
+    return median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(3)
+    assert json.loads(legacy(make_rows(3))) == json.loads(response.dumps({'posts': rows, 'nextCursor': None}))
+
+    print(f'{args.rows} rows, orjson: {"yes" if response.orjson else "no"}')
+    baseline = measure('isoformat loop + json.dumps', legacy, args.rows, args.repeat)
+    for name, fn in (
+        ('json.dumps default=', stdlib_default),
+        ('response.dumps', lambda rows: response.dumps({'posts': rows, 'nextCursor': None})),
+        ('response.ndjson', response.ndjson),
+    ):
+        median = measure(name, fn, args.rows, args.repeat)
+        print(f'{"":<28} x{baseline / median:.1f} vs baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''Задержка запросов к Twitter: новый цикл и клиент на каждый запрос против одного цикла и пула соединений.
+
+Режим http сравнивает транспорт напрямую (без учётных данных):
+    python benchmarks/twitter_latency.py http --requests 30
+
+Режим handler вызывает функцию backend/twitter в одном процессе, как тёплый контейнер
+(нужны DATABASE_URL и настроенные данные для входа):
+    DATABASE_URL=... python benchmarks/twitter_latency.py handler --requests 10
+'''
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+TWITTER_DIR = os.path.join(os.path.dirname(__file__), '..', 'backend', 'twitter')
+
+
+def measure(name: str, fn, requests: int) -> None:
+    '''Первый запрос показывает холодный путь, p50/p95 — тёплый'''
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    first = samples[0]
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f'{name:<32} first {first:>8.1f} ms  p50 {statistics.median(samples):>8.1f} ms  p95 {p95:>8.1f} ms')
+
+
+def bench_http(url: str, requests: int) -> None:
+    sys.path.insert(0, TWITTER_DIR)
+    from session import HTTP_LIMITS
+
+    def per_call():
+        # Прежнее поведение: новый цикл и новый клиент, TLS-рукопожатие на каждый запрос
+        loop = asyncio.new_event_loop()
+
+        async def fetch():
+            async with httpx.AsyncClient() as client:
+                await client.get(url)
+
+        loop.run_until_complete(fetch())
+        loop.close()
+
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(limits=HTTP_LIMITS)
+
+    def persistent():
+        loop.run_until_complete(client.get(url))
+
+    measure('new loop + client per request', per_call, requests)
+    measure('persistent loop + pooled client', persistent, requests)
+    loop.run_until_complete(client.aclose())
+
+
+def bench_handler(requests: int) -> None:
+    sys.path.insert(0, TWITTER_DIR)
+    from index import handler
+
+    measure('handler GET (warm container)', lambda: handler({'httpMethod': 'GET'}, None), requests)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=['http', 'handler'])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--url', default='https://api.x.com/1.1/help/settings.json')
+    args = parser.parse_args()
+
+    if args.mode == 'http':
+        bench_http(args.url, args.requests)
+    else:
+        bench_handler(args.requests)
+
+
+if __name__ == '__main__':
+    main()
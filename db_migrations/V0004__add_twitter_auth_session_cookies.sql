@@ -0,0 +1,5 @@
+
+-- Cookies сессии twikit храним рядом с данными для входа, чтобы не логиниться на каждый запрос
+ALTER TABLE t_p42702992_twitter_auto_post_bo.twitter_auth
+  ADD COLUMN IF NOT EXISTS session_cookies TEXT,
+  ADD COLUMN IF NOT EXISTS session_updated_at TIMESTAMP;
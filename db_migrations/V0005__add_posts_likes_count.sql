@@ -0,0 +1,14 @@
+
+-- Денормализованный счётчик лайков: список постов больше не джойнит и не группирует likes
+ALTER TABLE t_p42702992_twitter_auto_post_bo.posts
+  ADD COLUMN IF NOT EXISTS likes_count INTEGER NOT NULL DEFAULT 0;
+
+-- Заполняем счётчик по уже существующим лайкам
+UPDATE t_p42702992_twitter_auto_post_bo.posts p
+SET likes_count = l.cnt
+FROM (
+    SELECT post_id, COUNT(*) AS cnt
+    FROM t_p42702992_twitter_auto_post_bo.likes
+    GROUP BY post_id
+) l
+WHERE p.id = l.post_id;
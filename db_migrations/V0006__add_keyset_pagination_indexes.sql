@@ -0,0 +1,13 @@
+
+-- Индексы под keyset-пагинацию списков постов и аккаунтов
+CREATE INDEX IF NOT EXISTS idx_posts_scheduled_id
+  ON t_p42702992_twitter_auto_post_bo.posts(scheduled_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_posts_status_scheduled_id
+  ON t_p42702992_twitter_auto_post_bo.posts(status, scheduled_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_posts_account_scheduled_id
+  ON t_p42702992_twitter_auto_post_bo.posts(account_id, scheduled_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_accounts_created_id
+  ON t_p42702992_twitter_auto_post_bo.accounts(created_at DESC, id DESC);
@@ -0,0 +1,11 @@
+
+-- Счётчики версий данных: функции держат кэш в памяти контейнера и сбрасывают его, когда версия меняется
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.cache_versions (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p42702992_twitter_auto_post_bo.cache_versions (name)
+VALUES ('accounts')
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,21 @@
+
+-- Состояние исполнения отложенных лайков
+ALTER TABLE t_p42702992_twitter_auto_post_bo.likes
+  ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'pending',
+  ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS executed_at TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS error TEXT;
+
+-- Старые лайки никто так и не выполнил; через сутки ставить их уже поздно
+UPDATE t_p42702992_twitter_auto_post_bo.likes
+SET status = 'expired'
+WHERE liked_at < CURRENT_TIMESTAMP - INTERVAL '1 day';
+
+CREATE INDEX IF NOT EXISTS idx_likes_pending
+  ON t_p42702992_twitter_auto_post_bo.likes(liked_at)
+  WHERE status IN ('pending', 'running');
+
+-- Cookies сессий аккаунтов, от имени которых ставятся лайки
+ALTER TABLE t_p42702992_twitter_auto_post_bo.accounts
+  ADD COLUMN IF NOT EXISTS session_cookies TEXT,
+  ADD COLUMN IF NOT EXISTS session_updated_at TIMESTAMP;
@@ -0,0 +1,17 @@
+
+-- Token bucket на каждый аккаунт и тип действия (tweet, like); общий для всех воркеров
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.rate_limits (
+    account_key TEXT NOT NULL,
+    action TEXT NOT NULL,
+    tokens DOUBLE PRECISION NOT NULL,
+    capacity DOUBLE PRECISION NOT NULL,
+    refill_per_second DOUBLE PRECISION NOT NULL,
+    last_granted INTEGER NOT NULL DEFAULT 0,
+    blocked_until TIMESTAMP,
+    rate_limited_count INTEGER NOT NULL DEFAULT 0,
+    observed_limit INTEGER,
+    observed_remaining INTEGER,
+    observed_reset_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (account_key, action)
+);
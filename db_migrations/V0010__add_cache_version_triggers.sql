@@ -0,0 +1,57 @@
+-- Версии таблиц для ETag списков: любой реально изменивший строки запрос поднимает версию своей таблицы
+INSERT INTO t_p42702992_twitter_auto_post_bo.cache_versions (name)
+VALUES ('posts'), ('likes')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version()
+RETURNS trigger AS $$
+BEGIN
+  -- Триггер на уровне запроса: UPDATE без затронутых строк версию не трогает
+  IF EXISTS (SELECT 1 FROM changed) THEN
+    INSERT INTO t_p42702992_twitter_auto_post_bo.cache_versions (name)
+    VALUES (TG_ARGV[0])
+    ON CONFLICT (name) DO UPDATE
+    SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS accounts_version_insert ON t_p42702992_twitter_auto_post_bo.accounts;
+DROP TRIGGER IF EXISTS accounts_version_update ON t_p42702992_twitter_auto_post_bo.accounts;
+DROP TRIGGER IF EXISTS accounts_version_delete ON t_p42702992_twitter_auto_post_bo.accounts;
+CREATE TRIGGER accounts_version_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.accounts
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('accounts');
+CREATE TRIGGER accounts_version_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.accounts
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('accounts');
+CREATE TRIGGER accounts_version_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.accounts
+  REFERENCING OLD TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('accounts');
+
+DROP TRIGGER IF EXISTS posts_version_insert ON t_p42702992_twitter_auto_post_bo.posts;
+DROP TRIGGER IF EXISTS posts_version_update ON t_p42702992_twitter_auto_post_bo.posts;
+DROP TRIGGER IF EXISTS posts_version_delete ON t_p42702992_twitter_auto_post_bo.posts;
+CREATE TRIGGER posts_version_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.posts
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('posts');
+CREATE TRIGGER posts_version_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.posts
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('posts');
+CREATE TRIGGER posts_version_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.posts
+  REFERENCING OLD TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('posts');
+
+DROP TRIGGER IF EXISTS likes_version_insert ON t_p42702992_twitter_auto_post_bo.likes;
+DROP TRIGGER IF EXISTS likes_version_update ON t_p42702992_twitter_auto_post_bo.likes;
+DROP TRIGGER IF EXISTS likes_version_delete ON t_p42702992_twitter_auto_post_bo.likes;
+CREATE TRIGGER likes_version_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('likes');
+CREATE TRIGGER likes_version_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('likes');
+CREATE TRIGGER likes_version_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING OLD TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('likes');
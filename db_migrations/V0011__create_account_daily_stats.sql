@@ -0,0 +1,205 @@
+-- Сводка активности по аккаунтам и дням: дашборд читает её вместо полного прохода по likes и posts
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.account_daily_stats (
+    account_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    likes_given INTEGER NOT NULL DEFAULT 0,
+    likes_done INTEGER NOT NULL DEFAULT 0,
+    likes_received INTEGER NOT NULL DEFAULT 0,
+    posts_scheduled INTEGER NOT NULL DEFAULT 0,
+    posts_published INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_account_daily_stats_day
+  ON t_p42702992_twitter_auto_post_bo.account_daily_stats(day);
+
+-- Прибавляет к сводке изменения одного запроса; delta — SELECT по таблицам переходов триггера
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes()
+RETURNS trigger AS $$
+DECLARE
+  delta TEXT;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    delta := 'SELECT post_id, account_id, liked_at::date AS day, (status = ''done'')::int AS done, 1 AS sign FROM new_rows';
+  ELSIF TG_OP = 'DELETE' THEN
+    delta := 'SELECT post_id, account_id, liked_at::date AS day, (status = ''done'')::int AS done, -1 AS sign FROM old_rows';
+  ELSE
+    -- Исполнитель лайков постоянно меняет status, claimed_at и error; в сводку идут только строки,
+    -- у которых изменилось что-то учитываемое
+    delta := '
+      WITH changed AS (
+        SELECT o.post_id AS old_post, o.account_id AS old_account, o.liked_at::date AS old_day, (o.status = ''done'')::int AS old_done,
+               n.post_id AS new_post, n.account_id AS new_account, n.liked_at::date AS new_day, (n.status = ''done'')::int AS new_done
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        WHERE (o.post_id, o.account_id, o.liked_at::date, o.status = ''done'')
+          IS DISTINCT FROM (n.post_id, n.account_id, n.liked_at::date, n.status = ''done'')
+      )
+      SELECT old_post, old_account, old_day, old_done, -1 FROM changed
+      UNION ALL
+      SELECT new_post, new_account, new_day, new_done, 1 FROM changed';
+  END IF;
+
+  -- Полученные лайки относятся к автору поста; строки сортируются, чтобы параллельные запросы
+  -- блокировали строки сводки в одном порядке и не ловили взаимную блокировку
+  EXECUTE format($sql$
+    WITH delta (post_id, account_id, day, done, sign) AS (%s),
+    counts AS (
+      SELECT account_id, day, SUM(sign) AS given, SUM(sign * done) AS done, 0 AS received
+      FROM delta
+      WHERE day IS NOT NULL
+      GROUP BY account_id, day
+      UNION ALL
+      SELECT p.account_id, d.day, 0, 0, SUM(d.sign)
+      FROM delta d
+      JOIN t_p42702992_twitter_auto_post_bo.posts p ON p.id = d.post_id
+      WHERE d.day IS NOT NULL AND p.account_id IS NOT NULL
+      GROUP BY p.account_id, d.day
+    )
+    INSERT INTO t_p42702992_twitter_auto_post_bo.account_daily_stats AS s
+      (account_id, day, likes_given, likes_done, likes_received)
+    SELECT account_id, day, SUM(given), SUM(done), SUM(received)
+    FROM counts
+    GROUP BY account_id, day
+    HAVING SUM(given) <> 0 OR SUM(done) <> 0 OR SUM(received) <> 0
+    ORDER BY account_id, day
+    ON CONFLICT (account_id, day) DO UPDATE
+    SET likes_given = s.likes_given + EXCLUDED.likes_given,
+        likes_done = s.likes_done + EXCLUDED.likes_done,
+        likes_received = s.likes_received + EXCLUDED.likes_received
+  $sql$, delta);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_posts()
+RETURNS trigger AS $$
+DECLARE
+  delta TEXT;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    delta := 'SELECT account_id, scheduled_time::date, CASE WHEN status = ''published'' THEN published_at::date END, 1 FROM new_rows';
+  ELSIF TG_OP = 'DELETE' THEN
+    delta := 'SELECT account_id, scheduled_time::date, CASE WHEN status = ''published'' THEN published_at::date END, -1 FROM old_rows';
+  ELSE
+    -- Диспетчер двигает статусы пачками (pending -> publishing -> failed); сводку меняют только
+    -- перенос поста и публикация
+    delta := '
+      WITH changed AS (
+        SELECT o.account_id AS old_account, o.scheduled_time::date AS old_scheduled,
+               CASE WHEN o.status = ''published'' THEN o.published_at::date END AS old_published,
+               n.account_id AS new_account, n.scheduled_time::date AS new_scheduled,
+               CASE WHEN n.status = ''published'' THEN n.published_at::date END AS new_published
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+      )
+      SELECT old_account, old_scheduled, old_published, -1 FROM changed
+      WHERE (old_account, old_scheduled, old_published) IS DISTINCT FROM (new_account, new_scheduled, new_published)
+      UNION ALL
+      SELECT new_account, new_scheduled, new_published, 1 FROM changed
+      WHERE (old_account, old_scheduled, old_published) IS DISTINCT FROM (new_account, new_scheduled, new_published)';
+  END IF;
+
+  EXECUTE format($sql$
+    WITH delta (account_id, scheduled_day, published_day, sign) AS (%s),
+    counts AS (
+      SELECT account_id, scheduled_day AS day, SUM(sign) AS scheduled, 0 AS published
+      FROM delta
+      WHERE account_id IS NOT NULL AND scheduled_day IS NOT NULL
+      GROUP BY account_id, scheduled_day
+      UNION ALL
+      SELECT account_id, published_day, 0, SUM(sign)
+      FROM delta
+      WHERE account_id IS NOT NULL AND published_day IS NOT NULL
+      GROUP BY account_id, published_day
+    )
+    INSERT INTO t_p42702992_twitter_auto_post_bo.account_daily_stats AS s
+      (account_id, day, posts_scheduled, posts_published)
+    SELECT account_id, day, SUM(scheduled), SUM(published)
+    FROM counts
+    GROUP BY account_id, day
+    HAVING SUM(scheduled) <> 0 OR SUM(published) <> 0
+    ORDER BY account_id, day
+    ON CONFLICT (account_id, day) DO UPDATE
+    SET posts_scheduled = s.posts_scheduled + EXCLUDED.posts_scheduled,
+        posts_published = s.posts_published + EXCLUDED.posts_published
+  $sql$, delta);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Пересчёт сводки с нуля начиная с дня since (NULL — вся история); возвращает число строк сводки
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.rebuild_account_daily_stats(since DATE DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  rebuilt INTEGER;
+BEGIN
+  -- Ждём транзакции, которые уже поменяли сводку триггерами, и не пускаем новые до конца пересчёта:
+  -- иначе их изменения посчитаются дважды или потеряются
+  LOCK TABLE t_p42702992_twitter_auto_post_bo.account_daily_stats IN EXCLUSIVE MODE;
+
+  DELETE FROM t_p42702992_twitter_auto_post_bo.account_daily_stats
+  WHERE since IS NULL OR day >= since;
+
+  INSERT INTO t_p42702992_twitter_auto_post_bo.account_daily_stats
+    (account_id, day, likes_given, likes_done, likes_received, posts_scheduled, posts_published)
+  SELECT account_id, day, SUM(given), SUM(done), SUM(received), SUM(scheduled), SUM(published)
+  FROM (
+    SELECT l.account_id, l.liked_at::date AS day, COUNT(*) AS given,
+           COUNT(*) FILTER (WHERE l.status = 'done') AS done, 0 AS received, 0 AS scheduled, 0 AS published
+    FROM t_p42702992_twitter_auto_post_bo.likes l
+    WHERE l.liked_at IS NOT NULL AND (since IS NULL OR l.liked_at >= since)
+    GROUP BY l.account_id, l.liked_at::date
+    UNION ALL
+    SELECT p.account_id, l.liked_at::date, 0, 0, COUNT(*), 0, 0
+    FROM t_p42702992_twitter_auto_post_bo.likes l
+    JOIN t_p42702992_twitter_auto_post_bo.posts p ON p.id = l.post_id
+    WHERE p.account_id IS NOT NULL AND l.liked_at IS NOT NULL AND (since IS NULL OR l.liked_at >= since)
+    GROUP BY p.account_id, l.liked_at::date
+    UNION ALL
+    SELECT account_id, scheduled_time::date, 0, 0, 0, COUNT(*), 0
+    FROM t_p42702992_twitter_auto_post_bo.posts
+    WHERE account_id IS NOT NULL AND (since IS NULL OR scheduled_time >= since)
+    GROUP BY account_id, scheduled_time::date
+    UNION ALL
+    SELECT account_id, published_at::date, 0, 0, 0, 0, COUNT(*)
+    FROM t_p42702992_twitter_auto_post_bo.posts
+    WHERE account_id IS NOT NULL AND status = 'published' AND published_at IS NOT NULL
+      AND (since IS NULL OR published_at >= since)
+    GROUP BY account_id, published_at::date
+  ) AS counts
+  GROUP BY account_id, day;
+
+  GET DIAGNOSTICS rebuilt = ROW_COUNT;
+  RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS likes_rollup_insert ON t_p42702992_twitter_auto_post_bo.likes;
+DROP TRIGGER IF EXISTS likes_rollup_update ON t_p42702992_twitter_auto_post_bo.likes;
+DROP TRIGGER IF EXISTS likes_rollup_delete ON t_p42702992_twitter_auto_post_bo.likes;
+CREATE TRIGGER likes_rollup_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes();
+CREATE TRIGGER likes_rollup_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes();
+CREATE TRIGGER likes_rollup_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes();
+
+DROP TRIGGER IF EXISTS posts_rollup_insert ON t_p42702992_twitter_auto_post_bo.posts;
+DROP TRIGGER IF EXISTS posts_rollup_update ON t_p42702992_twitter_auto_post_bo.posts;
+DROP TRIGGER IF EXISTS posts_rollup_delete ON t_p42702992_twitter_auto_post_bo.posts;
+CREATE TRIGGER posts_rollup_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.posts
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_posts();
+CREATE TRIGGER posts_rollup_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.posts
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_posts();
+CREATE TRIGGER posts_rollup_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.posts
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_posts();
+
+-- Начальное заполнение по уже накопленной истории
+SELECT t_p42702992_twitter_auto_post_bo.rebuild_account_daily_stats();
@@ -0,0 +1,129 @@
+-- likes секционируется по месяцам liked_at: свежие запросы читают одну-две секции, старые секции
+-- отсоединяются и уходят в архив (backend/likes/retention.py)
+ALTER TABLE t_p42702992_twitter_auto_post_bo.likes RENAME TO likes_unpartitioned;
+ALTER SEQUENCE t_p42702992_twitter_auto_post_bo.likes_id_seq OWNED BY NONE;
+
+CREATE TABLE t_p42702992_twitter_auto_post_bo.likes (
+    id INTEGER NOT NULL DEFAULT nextval('t_p42702992_twitter_auto_post_bo.likes_id_seq'),
+    post_id INTEGER NOT NULL REFERENCES t_p42702992_twitter_auto_post_bo.posts(id),
+    account_id INTEGER NOT NULL REFERENCES t_p42702992_twitter_auto_post_bo.accounts(id),
+    liked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_mutual BOOLEAN DEFAULT true,
+    delay_minutes INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_at TIMESTAMP,
+    executed_at TIMESTAMP,
+    error TEXT
+) PARTITION BY RANGE (liked_at);
+
+-- Месячные секции с начала месяца since (по умолчанию — прошлого) до months_ahead месяцев вперёд.
+-- Уникальность (post_id, account_id) без liked_at в ключе на секционированной таблице не объявить,
+-- поэтому уникальный индекс создаётся в каждой секции, а между секциями дубли отсекает вставка
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.ensure_likes_partitions(
+    since DATE DEFAULT NULL,
+    months_ahead INTEGER DEFAULT 3
+)
+RETURNS INTEGER AS $$
+DECLARE
+  month_start DATE := date_trunc('month', COALESCE(since, CURRENT_DATE - INTERVAL '1 month'))::date;
+  last_month DATE := (date_trunc('month', CURRENT_DATE) + months_ahead * INTERVAL '1 month')::date;
+  partition_name TEXT;
+  created INTEGER := 0;
+BEGIN
+  -- Два контейнера могут начать новый месяц одновременно
+  PERFORM pg_advisory_xact_lock(hashtext('t_p42702992_twitter_auto_post_bo.likes_partitions'));
+
+  WHILE month_start <= last_month LOOP
+    partition_name := 'likes_p' || to_char(month_start, 'YYYY_MM');
+    IF to_regclass('t_p42702992_twitter_auto_post_bo.' || partition_name) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE t_p42702992_twitter_auto_post_bo.%I PARTITION OF t_p42702992_twitter_auto_post_bo.likes FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, (month_start + INTERVAL '1 month')::date
+      );
+      EXECUTE format(
+        'CREATE UNIQUE INDEX %I ON t_p42702992_twitter_auto_post_bo.%I (post_id, account_id)',
+        partition_name || '_post_account', partition_name
+      );
+      created := created + 1;
+    END IF;
+    month_start := (month_start + INTERVAL '1 month')::date;
+  END LOOP;
+
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединяет секции целиком старше keep_months месяцев и возвращает их имена; сами таблицы остаются
+-- до архивации. Сводку account_daily_stats отсоединение не меняет: история в ней сохраняется
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.detach_old_likes_partitions(keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+  horizon DATE := (date_trunc('month', CURRENT_DATE) - keep_months * INTERVAL '1 month')::date;
+  partition_name TEXT;
+BEGIN
+  FOR partition_name IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 't_p42702992_twitter_auto_post_bo.likes'::regclass
+      AND c.relname ~ '^likes_p\d{4}_\d{2}$'
+      AND to_date(substr(c.relname, 8), 'YYYY_MM') < horizon
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('ALTER TABLE t_p42702992_twitter_auto_post_bo.likes DETACH PARTITION t_p42702992_twitter_auto_post_bo.%I', partition_name);
+    RETURN NEXT partition_name;
+  END LOOP;
+
+  -- Строки пропали из likes без DELETE, поэтому версию для ETag поднимаем сами
+  IF FOUND THEN
+    UPDATE t_p42702992_twitter_auto_post_bo.cache_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE name = 'likes';
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Лайки без liked_at из старых версий схемы датируем исполнением или моментом миграции
+SELECT t_p42702992_twitter_auto_post_bo.ensure_likes_partitions(
+  (SELECT MIN(COALESCE(liked_at, executed_at, CURRENT_TIMESTAMP))::date FROM t_p42702992_twitter_auto_post_bo.likes_unpartitioned)
+);
+
+-- Триггеры сводок и версий ещё не созданы: перенос не трогает account_daily_stats и cache_versions
+INSERT INTO t_p42702992_twitter_auto_post_bo.likes
+  (id, post_id, account_id, liked_at, is_mutual, delay_minutes, status, claimed_at, executed_at, error)
+SELECT id, post_id, account_id, COALESCE(liked_at, executed_at, CURRENT_TIMESTAMP), is_mutual, delay_minutes,
+       status, claimed_at, executed_at, error
+FROM t_p42702992_twitter_auto_post_bo.likes_unpartitioned;
+
+DROP TABLE t_p42702992_twitter_auto_post_bo.likes_unpartitioned;
+ALTER SEQUENCE t_p42702992_twitter_auto_post_bo.likes_id_seq OWNED BY t_p42702992_twitter_auto_post_bo.likes.id;
+
+-- Индексы на родительской таблице создаются и во всех будущих секциях
+ALTER TABLE t_p42702992_twitter_auto_post_bo.likes ADD PRIMARY KEY (id, liked_at);
+
+CREATE INDEX IF NOT EXISTS idx_likes_liked_at
+  ON t_p42702992_twitter_auto_post_bo.likes(liked_at);
+
+CREATE INDEX IF NOT EXISTS idx_likes_pending
+  ON t_p42702992_twitter_auto_post_bo.likes(liked_at)
+  WHERE status IN ('pending', 'running');
+
+CREATE TRIGGER likes_version_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('likes');
+CREATE TRIGGER likes_version_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('likes');
+CREATE TRIGGER likes_version_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING OLD TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('likes');
+
+CREATE TRIGGER likes_rollup_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes();
+CREATE TRIGGER likes_rollup_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes();
+CREATE TRIGGER likes_rollup_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.likes
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.rollup_likes();
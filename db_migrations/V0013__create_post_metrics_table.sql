@@ -0,0 +1,35 @@
+-- Метрики опубликованных твитов из Twitter; заполняет action=sync-metrics функции twitter
+CREATE TABLE IF NOT EXISTS t_p42702992_twitter_auto_post_bo.post_metrics (
+    post_id INTEGER PRIMARY KEY REFERENCES t_p42702992_twitter_auto_post_bo.posts(id),
+    like_count INTEGER,
+    retweet_count INTEGER,
+    reply_count INTEGER,
+    quote_count INTEGER,
+    view_count BIGINT,
+    -- Твит удалён или недоступен: больше не запрашиваем
+    unavailable BOOLEAN NOT NULL DEFAULT false,
+    synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Очередь синхронизации идёт от свежих публикаций к старым
+CREATE INDEX IF NOT EXISTS idx_posts_published_recent
+  ON t_p42702992_twitter_auto_post_bo.posts(published_at DESC NULLS LAST, id DESC)
+  WHERE status = 'published' AND twitter_post_id IS NOT NULL;
+
+-- GET /posts отдаёт метрики, поэтому их изменения тоже сбрасывают ETag списка
+INSERT INTO t_p42702992_twitter_auto_post_bo.cache_versions (name)
+VALUES ('post_metrics')
+ON CONFLICT (name) DO NOTHING;
+
+DROP TRIGGER IF EXISTS post_metrics_version_insert ON t_p42702992_twitter_auto_post_bo.post_metrics;
+DROP TRIGGER IF EXISTS post_metrics_version_update ON t_p42702992_twitter_auto_post_bo.post_metrics;
+DROP TRIGGER IF EXISTS post_metrics_version_delete ON t_p42702992_twitter_auto_post_bo.post_metrics;
+CREATE TRIGGER post_metrics_version_insert AFTER INSERT ON t_p42702992_twitter_auto_post_bo.post_metrics
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('post_metrics');
+CREATE TRIGGER post_metrics_version_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.post_metrics
+  REFERENCING NEW TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('post_metrics');
+CREATE TRIGGER post_metrics_version_delete AFTER DELETE ON t_p42702992_twitter_auto_post_bo.post_metrics
+  REFERENCING OLD TABLE AS changed FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_cache_version('post_metrics');
@@ -0,0 +1,21 @@
+-- Версия данных для входа: функция twitter держит их и основную сессию в памяти, пока версия не изменится
+INSERT INTO t_p42702992_twitter_auto_post_bo.cache_versions (name)
+VALUES ('twitter_auth')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.bump_twitter_auth_version()
+RETURNS trigger AS $$
+BEGIN
+  UPDATE t_p42702992_twitter_auto_post_bo.cache_versions
+  SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+  WHERE name = 'twitter_auth';
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Сохранение cookies сессии (UPDATE session_cookies) версию не трогает, иначе каждый логин сбрасывал бы свою же сессию
+DROP TRIGGER IF EXISTS twitter_auth_version ON t_p42702992_twitter_auto_post_bo.twitter_auth;
+CREATE TRIGGER twitter_auth_version
+  AFTER INSERT OR DELETE OR UPDATE OF auth_token ON t_p42702992_twitter_auto_post_bo.twitter_auth
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_twitter_auth_version();
@@ -0,0 +1,26 @@
+-- Версию accounts поднимают только поля, которые видят список аккаунтов, пул клиентов twitter и выборка
+-- лайкеров. Сохранение cookies сессии при каждом логине (UPDATE session_cookies) версию больше не трогает.
+-- UPDATE OF со списком колонок нельзя совместить с таблицами переходов, поэтому изменения сравниваются по строкам
+CREATE OR REPLACE FUNCTION t_p42702992_twitter_auto_post_bo.bump_accounts_version()
+RETURNS trigger AS $$
+BEGIN
+  IF EXISTS (
+    SELECT 1
+    FROM new_rows n
+    JOIN old_rows o ON o.id = n.id
+    WHERE (n.username, n.auth_token, n.avatar_url, n.is_active)
+          IS DISTINCT FROM (o.username, o.auth_token, o.avatar_url, o.is_active)
+  ) THEN
+    INSERT INTO t_p42702992_twitter_auto_post_bo.cache_versions (name)
+    VALUES ('accounts')
+    ON CONFLICT (name) DO UPDATE
+    SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS accounts_version_update ON t_p42702992_twitter_auto_post_bo.accounts;
+CREATE TRIGGER accounts_version_update AFTER UPDATE ON t_p42702992_twitter_auto_post_bo.accounts
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT
+  EXECUTE FUNCTION t_p42702992_twitter_auto_post_bo.bump_accounts_version();